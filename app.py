@@ -1,68 +1,16 @@
 import streamlit as st
-from ultralytics import YOLO
-import cv2
-import tempfile
-from PIL import Image
-import numpy as np
-import sqlite3
-import hashlib
 import os
-from streamlit_webrtc import webrtc_streamer, VideoProcessorBase
-import av
+import re
+import sys
+import threading
+import time
 
-
-# ================= DATABASE SETUP =================
-def init_database():
-    """Initialize database and create users table if not exists"""
-    conn = sqlite3.connect("app.db")
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users 
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  username TEXT UNIQUE NOT NULL,
-                  email TEXT UNIQUE NOT NULL,
-                  password_hash TEXT NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.commit()
-    conn.close()
-
-
-def get_connection():
-    return sqlite3.connect("app.db")
-
-
-def create_user(username, email, password):
-    if not username or not email or not password:
-        return False, "Vui lòng nhập đầy đủ thông tin!"
-
-    if len(password) < 6:
-        return False, "Mật khẩu phải có ít nhất 6 ký tự!"
-
-    conn = get_connection()
-    c = conn.cursor()
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
-    try:
-        c.execute("INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
-                  (username, email, password_hash))
-        conn.commit()
-        return True, "Đăng ký thành công!"
-    except sqlite3.IntegrityError:
-        return False, "Tên đăng nhập hoặc email đã tồn tại!"
-    finally:
-        conn.close()
-
-
-def check_login(username, password):
-    if not username or not password:
-        return False
-
-    conn = get_connection()
-    c = conn.cursor()
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
-    c.execute("SELECT id FROM users WHERE username=? AND password_hash=?",
-              (username, password_hash))
-    result = c.fetchone()
-    conn.close()
-    return result is not None
+# Chỉ import module nhẹ ở đây: cv2, ultralytics, av, streamlit_webrtc, pandas
+# được import trong trang dùng chúng để trang chủ / đăng nhập hiển thị ngay
+import auth
+import db
+import metrics
+import migrations
 
 
 # ================= APP CONFIG =================
@@ -73,8 +21,17 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Initialize database
-init_database()
+# Initialize database (chỉ chạy migration lần đầu trong process)
+migrations.migrate()
+
+
+@st.cache_resource(ttl=24 * 3600)
+def purge_expired_sessions():
+    # Xoá token ghi nhớ đăng nhập đã hết hạn / bị thu hồi: một lần khi process khởi động, sau đó mỗi ngày
+    return db.purge_sessions()
+
+
+purge_expired_sessions()
 
 # ================= SESSION STATE =================
 if "logged_in" not in st.session_state:
@@ -83,360 +40,71 @@ if "page" not in st.session_state:
     st.session_state.page = "home"
 if "username" not in st.session_state:
     st.session_state.username = ""
+if "recorded_uploads" not in st.session_state:
+    st.session_state.recorded_uploads = set()
+if "upload_keys" not in st.session_state:
+    st.session_state.upload_keys = {}
+
+# ================= STATIC CSS / HTML =================
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+HEADER_HTML = """
+<div class="main-header">
+    <div class="main-title">🎯 HAUI_SuperModel</div>
+    <div class="main-subtitle">Phát triển bởi nhóm HAUI_SuperModel</div>
+</div>
+"""
 
-# ================= MODERN CSS STYLING =================
-st.markdown("""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
-
-/* Hide Streamlit elements */
-header[data-testid="stHeader"] {visibility: hidden;}
-.stDeployButton {display: none;}
-footer {visibility: hidden;}
-#MainMenu {visibility: hidden;}
-
-/* Main app styling */
-.stApp {
-    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-    font-family: 'Inter', sans-serif;
-}
-
-/* Header */
-.main-header {
-    background: linear-gradient(135deg, #ff6b6b, #4ecdc4, #45b7d1, #96ceb4);
-    background-size: 400% 400%;
-    animation: gradientShift 8s ease infinite;
-    padding: 2.5rem;
-    border-radius: 20px;
-    text-align: center;
-    margin-bottom: 2rem;
-    box-shadow: 0 25px 50px rgba(0,0,0,0.15);
-    backdrop-filter: blur(10px);
-    border: 1px solid rgba(255,255,255,0.2);
-}
-
-@keyframes gradientShift {
-    0% { background-position: 0% 50%; }
-    50% { background-position: 100% 50%; }
-    100% { background-position: 0% 50%; }
-}
-
-.main-title {
-    font-size: 3.5rem;
-    font-weight: 800;
-    color: white;
-    text-shadow: 3px 3px 6px rgba(0,0,0,0.3);
-    margin: 0;
-    letter-spacing: -1px;
-}
-
-.main-subtitle {
-    font-size: 1.3rem;
-    color: rgba(255,255,255,0.95);
-    margin-top: 0.8rem;
-    font-weight: 400;
-    text-shadow: 1px 1px 2px rgba(0,0,0,0.2);
-}
-
-/* Navigation */
-.nav-container {
-    display: flex;
-    justify-content: center;
-    gap: 1.5rem;
-    margin-bottom: 2.5rem;
-    flex-wrap: wrap;
-    padding: 0 1rem;
-}
-
-.stButton > button {
-    background: linear-gradient(145deg, #ffffff, #f8fafc) !important;
-    border: 2px solid rgba(79, 70, 229, 0.1) !important;
-    padding: 1rem 2rem !important;
-    border-radius: 15px !important;
-    font-weight: 600 !important;
-    font-size: 1rem !important;
-    color: #1f2937 !important;
-    transition: all 0.3s ease !important;
-    box-shadow: 0 8px 16px rgba(0,0,0,0.1) !important;
-    height: auto !important;
-    min-height: 3rem !important;
-}
-
-.stButton > button:hover {
-    transform: translateY(-3px) !important;
-    box-shadow: 0 15px 30px rgba(0,0,0,0.2) !important;
-    background: linear-gradient(145deg, #f8fafc, #ffffff) !important;
-    border-color: rgba(79, 70, 229, 0.3) !important;
-}
-
-.stButton > button:active {
-    transform: translateY(-1px) !important;
-}
-
-/* Content cards */
-.content-card {
-    background: rgba(255, 255, 255, 0.95);
-    padding: 2.5rem;
-    border-radius: 25px;
-    box-shadow: 0 25px 50px rgba(0,0,0,0.15);
-    backdrop-filter: blur(15px);
-    border: 1px solid rgba(255,255,255,0.3);
-    margin-bottom: 2rem;
-}
-
-/* Form styling */
-.login-form {
-    max-width: 450px;
-    margin: 0 auto;
-    padding: 2.5rem;
-    background: linear-gradient(145deg, #ffffff, #f8fafc);
-    border-radius: 25px;
-    box-shadow: 0 25px 50px rgba(0,0,0,0.15);
-    border: 1px solid rgba(0,0,0,0.05);
-}
-
-.form-title {
-    text-align: center;
-    font-size: 2.2rem;
-    font-weight: 700;
-    color: #1f2937;
-    margin-bottom: 2rem;
-    background: linear-gradient(135deg, #667eea, #764ba2);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-}
-
-/* Input styling */
-.stTextInput > div > div > input {
-    border-radius: 12px !important;
-    border: 2px solid #e5e7eb !important;
-    padding: 0.8rem 1rem !important;
-    font-size: 1rem !important;
-    transition: all 0.3s ease !important;
-    background: #ffffff !important;
-}
-
-.stTextInput > div > div > input:focus {
-    border-color: #4f46e5 !important;
-    box-shadow: 0 0 0 3px rgba(79, 70, 229, 0.1) !important;
-}
-
-/* Primary buttons */
-.primary-button button {
-    background: linear-gradient(145deg, #4f46e5, #7c3aed) !important;
-    color: white !important;
-    border: none !important;
-    border-radius: 12px !important;
-    padding: 0.8rem 2rem !important;
-    font-weight: 600 !important;
-    font-size: 1.1rem !important;
-    transition: all 0.3s ease !important;
-    box-shadow: 0 8px 16px rgba(79, 70, 229, 0.3) !important;
-}
-
-.primary-button button:hover {
-    transform: translateY(-2px) !important;
-    box-shadow: 0 12px 24px rgba(79, 70, 229, 0.4) !important;
-    background: linear-gradient(145deg, #7c3aed, #4f46e5) !important;
-}
-
-/* Success/Error messages */
-.success-message {
-    background: linear-gradient(135deg, #10b981, #059669);
-    color: white;
-    padding: 1rem 1.5rem;
-    border-radius: 12px;
-    text-align: center;
-    font-weight: 500;
-    margin: 1rem 0;
-    box-shadow: 0 4px 12px rgba(16, 185, 129, 0.3);
-}
-
-.error-message {
-    background: linear-gradient(135deg, #ef4444, #dc2626);
-    color: white;
-    padding: 1rem 1.5rem;
-    border-radius: 12px;
-    text-align: center;
-    font-weight: 500;
-    margin: 1rem 0;
-    box-shadow: 0 4px 12px rgba(239, 68, 68, 0.3);
-}
-
-/* Demo section */
-.demo-header {
-    text-align: center;
-    margin-bottom: 2rem;
-}
-
-.demo-title {
-    font-size: 2.5rem;
-    font-weight: 700;
-    color: #1f2937;
-    margin-bottom: 1rem;
-    background: linear-gradient(135deg, #667eea, #764ba2);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-}
-
-.user-info {
-    background: linear-gradient(135deg, #10b981, #059669);
-    color: white;
-    padding: 1rem 1.5rem;
-    border-radius: 15px;
-    text-align: center;
-    margin-bottom: 2rem;
-    font-weight: 500;
-    box-shadow: 0 8px 16px rgba(16, 185, 129, 0.3);
-}
-
-/* Radio buttons */
-.stRadio > div {
-    display: flex;
-    justify-content: center;
-    gap: 2rem;
-    background: rgba(255,255,255,0.1);
-    padding: 1rem;
-    border-radius: 15px;
-    margin-bottom: 2rem;
-}
-
-/* File uploader */
-.uploadedFile {
-    background: linear-gradient(145deg, #f9fafb, #ffffff) !important;
-    border-radius: 15px !important;
-    padding: 2rem !important;
-    border: 2px dashed #d1d5db !important;
-    text-align: center !important;
-}
-
-/* Contact info */
-.contact-grid {
-    display: grid;
-    grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-    gap: 2rem;
-    margin: 2rem 0;
-}
-
-.contact-card {
-    background: linear-gradient(145deg, #ffffff, #f8fafc);
-    padding: 2rem;
-    border-radius: 20px;
-    text-align: center;
-    box-shadow: 0 15px 30px rgba(0,0,0,0.1);
-    transition: all 0.3s ease;
-    border: 1px solid rgba(0,0,0,0.05);
-}
+FOOTER_HTML = """
+<div class="footer">
+    <div class="footer-text">© 2025 YOLO AI Vision | Developed by HAUI_SuperModel</div>
+</div>
+"""
 
-.contact-card:hover {
-    transform: translateY(-5px);
-    box-shadow: 0 20px 40px rgba(0,0,0,0.15);
-}
 
-.contact-icon {
-    font-size: 3rem;
-    margin-bottom: 1rem;
-    background: linear-gradient(135deg, #667eea, #764ba2);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-}
+@st.cache_resource
+def page_chrome():
+    """Minified CSS + header markup, built once per process instead of on every rerun"""
+    with open(os.path.join(STATIC_DIR, "style.css"), encoding="utf-8") as f:
+        css = f.read()
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{}:;,>])\s*", r"\1", css)
+    return f"<style>{css.strip()}</style>{HEADER_HTML.strip()}"
 
-/* Feature cards */
-.feature-grid {
-    display: grid;
-    grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
-    gap: 2rem;
-    margin: 3rem 0;
-}
 
-.feature-card {
-    background: linear-gradient(145deg, #ffffff, #f8fafc);
-    padding: 2.5rem;
-    border-radius: 20px;
-    text-align: center;
-    transition: all 0.3s ease;
-    box-shadow: 0 15px 30px rgba(0,0,0,0.08);
-    border: 1px solid rgba(0,0,0,0.03);
-}
+st.markdown(page_chrome(), unsafe_allow_html=True)
 
-.feature-card:hover {
-    transform: translateY(-8px);
-    box-shadow: 0 25px 50px rgba(0,0,0,0.15);
-}
 
-.feature-icon {
-    font-size: 3.5rem;
-    margin-bottom: 1.5rem;
-    background: linear-gradient(135deg, #667eea, #764ba2);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-}
+# ================= REMEMBER ME =================
+SESSION_COOKIE = "yolo_session"
 
-.feature-title {
-    font-size: 1.6rem;
-    font-weight: 600;
-    color: #1f2937;
-    margin-bottom: 1rem;
-}
 
-.feature-desc {
-    color: #6b7280;
-    line-height: 1.6;
-    font-size: 1rem;
-}
+def read_session_cookie():
+    # st.context.cookies có từ Streamlit 1.37; bản cũ hơn thì không khôi phục được phiên
+    context = getattr(st, "context", None)
+    return context.cookies.get(SESSION_COOKIE) if context is not None else None
 
-/* Footer */
-.footer {
-    background: rgba(255, 255, 255, 0.15);
-    backdrop-filter: blur(15px);
-    padding: 2.5rem;
-    text-align: center;
-    border-radius: 25px;
-    margin-top: 4rem;
-    border: 1px solid rgba(255,255,255,0.2);
-}
 
-.footer-text {
-    color: white;
-    font-weight: 500;
-    font-size: 1.1rem;
-    text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-}
+def write_session_cookie(token, max_age):
+    import streamlit.components.v1 as components
 
-/* Responsive */
-@media (max-width: 768px) {
-    .main-title { font-size: 2.5rem; }
-    .main-subtitle { font-size: 1.1rem; }
-    .nav-container { gap: 1rem; }
-    .content-card { padding: 1.5rem; }
-    .login-form { padding: 2rem; margin: 0 1rem; }
-}
+    components.html(f"<script>window.parent.document.cookie = '{SESSION_COOKIE}={token}; path=/; "
+                    f"max-age={max_age}; SameSite=Strict';</script>", height=0)
 
-/* Logout button */
-.logout-button button {
-    background: linear-gradient(145deg, #ef4444, #dc2626) !important;
-    color: white !important;
-    border: none !important;
-    padding: 0.6rem 1.5rem !important;
-    border-radius: 10px !important;
-    font-weight: 500 !important;
-    font-size: 0.9rem !important;
-}
 
-.logout-button button:hover {
-    background: linear-gradient(145deg, #dc2626, #b91c1c) !important;
-    transform: translateY(-1px) !important;
-}
-</style>
-""", unsafe_allow_html=True)
+# Phiên trình duyệt mới: đăng nhập lại bằng token trong cookie, không qua bcrypt
+if not st.session_state.logged_in and "session_restored" not in st.session_state:
+    st.session_state.session_restored = True
+    token = read_session_cookie()
+    user = auth.validate_session(token) if token else None
+    if user is not None:
+        st.session_state.logged_in = True
+        st.session_state.username = user[1]
+        st.session_state.session_token = token
 
-# ================= HEADER =================
-st.markdown("""
-    <div class="main-header">
-        <div class="main-title">🎯 HAUI_SuperModel</div>
-        <div class="main-subtitle">Phát triển bởi nhóm HAUI_SuperModel</div>
-    </div>
-""", unsafe_allow_html=True)
+if "pending_cookie" in st.session_state:
+    write_session_cookie(*st.session_state.pop("pending_cookie"))
 
 
 # ================= NAVIGATION =================
@@ -487,11 +155,23 @@ def render_navigation():
 
         with col5:
             if st.session_state.logged_in:
+                if st.session_state.page == "history":
+                    if st.button("🚀 AI Demo", key="demo_nav_btn"):
+                        st.session_state.page = "demo"
+                elif st.button("📊 Lịch sử", key="history_btn"):
+                    st.session_state.page = "history"
                 st.markdown('<div class="logout-button">', unsafe_allow_html=True)
                 if st.button("🚪 Đăng xuất", key="logout_btn"):
                     st.session_state.logged_in = False
                     st.session_state.username = ""
                     st.session_state.page = "home"
+                    token = st.session_state.pop("session_token", None)
+                    if token is not None:
+                        auth.revoke_session(token)
+                        st.session_state.pending_cookie = ("", 0)
+                    session_files = st.session_state.pop("session_files", None)
+                    if session_files is not None:
+                        session_files.cleanup()
                     st.rerun()
                 st.markdown('</div>', unsafe_allow_html=True)
             else:
@@ -505,19 +185,105 @@ render_navigation()
 
 
 # ================= LOAD MODEL =================
+# Model và các thư viện nặng chỉ được nạp khi trang demo được mở lần đầu
 @st.cache_resource
-def load_model():
+def get_model_registry():
+    from model_registry import shared_registry
+
+    return shared_registry()
+
+
+def load_model(name, engine):
     try:
-        return YOLO("best.pt")
+        return get_model_registry().get(name, engine)
     except Exception as e:
         st.error(f"❌ Không thể tải model YOLO: {str(e)}")
         return None
 
 
-model = load_model()
+@st.cache_resource
+def get_inference_server(weights_path, engine):
+    from inference_server import InferenceServer
+
+    # Một worker process dùng chung cho mọi session của server Streamlit
+    return InferenceServer(weights_path, engine)
+
+
+def load_inference_server(weights_path, engine):
+    try:
+        server = get_inference_server(weights_path, engine)
+        if not server.alive:
+            # Worker process đã chết: bỏ entry trong cache_resource để lần gọi sau khởi động lại
+            server.close()
+            get_inference_server.clear()
+            server = get_inference_server(weights_path, engine)
+        return server
+    except Exception as e:
+        st.error(f"❌ Không thể khởi động inference server: {str(e)}")
+        return None
+
+
+def _prewarm():
+    # Nạp sẵn thư viện nặng và model mặc định trong lúc người dùng còn ở trang chủ / đăng nhập
+    try:
+        import av  # noqa: F401
+        import cv2  # noqa: F401
+        import streamlit_webrtc  # noqa: F401
+        from model_registry import DEFAULT_MODEL, shared_registry
+
+        shared_registry().get(DEFAULT_MODEL)
+    except Exception as e:
+        print(f"[prewarm] bỏ qua: {e}", file=sys.stderr)
+
+
+@st.cache_resource
+def start_prewarm():
+    thread = threading.Thread(target=_prewarm, name="yolo-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+# YOLO_PREWARM=1: nạp model ở nền ngay khi server khởi động, không chặn trang đầu tiên
+if os.environ.get("YOLO_PREWARM", "0") == "1":
+    start_prewarm()
+
+
+@st.cache_resource
+def start_metrics_endpoint(port):
+    # Có endpoint scrape thì thu thập luôn bật cho cả process
+    metrics.enable()
+    return metrics.start_http_server(port)
+
+
+# METRICS_PORT=9100 -> http://127.0.0.1:9100/metrics cho Prometheus scrape
+if os.environ.get("METRICS_PORT"):
+    start_metrics_endpoint(int(os.environ["METRICS_PORT"]))
+
+
+@st.cache_resource
+def get_result_cache():
+    from result_cache import ResultCache
+
+    return ResultCache()
+
+
+@st.cache_resource
+def sweep_uploads():
+    import uploads
+
+    # Dọn thư mục tạm của các phiên cũ bị bỏ lại, một lần mỗi process
+    return uploads.sweep_stale()
+
 
 # ================= PAGES =================
-if st.session_state.page == "home":
+# Mỗi trang là một fragment: tương tác với widget trong trang chỉ chạy lại trang đó,
+# không chạy lại CSS, header, navigation và phần tải model.
+# st.fragment có từ Streamlit 1.37, bản cũ hơn là st.experimental_fragment
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", lambda f: f)
+
+
+@fragment
+def home_page():
     st.markdown('<div class="content-card">', unsafe_allow_html=True)
 
     st.markdown("# 🚀 Chào mừng đến với YOLO AI Vision")
@@ -588,7 +354,10 @@ if st.session_state.page == "home":
 
     st.markdown('</div>', unsafe_allow_html=True)
 
-elif st.session_state.page == "contact":
+
+
+@fragment
+def contact_page():
     st.markdown('<div class="content-card">', unsafe_allow_html=True)
 
     st.markdown("# 📞 Thông tin liên hệ")
@@ -645,7 +414,10 @@ elif st.session_state.page == "contact":
 
     st.markdown('</div>', unsafe_allow_html=True)
 
-elif st.session_state.page == "signup":
+
+
+@fragment
+def signup_page():
     st.markdown('<div class="content-card">', unsafe_allow_html=True)
 
     st.markdown('<div class="login-form">', unsafe_allow_html=True)
@@ -671,7 +443,10 @@ elif st.session_state.page == "signup":
             elif new_pw != confirm_pw:
                 st.markdown('<div class="error-message">❌ Mật khẩu xác nhận không khớp!</div>', unsafe_allow_html=True)
             else:
-                ok, msg = create_user(new_user, new_email, new_pw)
+                try:
+                    ok, msg = auth.register(new_user, new_email, new_pw)
+                except auth.AuthBusyError as e:
+                    ok, msg = False, str(e)
                 if ok:
                     st.markdown('<div class="success-message">🎉 ' + msg + ' Hãy đăng nhập để sử dụng!</div>',
                                 unsafe_allow_html=True)
@@ -685,7 +460,10 @@ elif st.session_state.page == "signup":
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
-elif st.session_state.page == "login":
+
+
+@fragment
+def login_page():
     st.markdown('<div class="content-card">', unsafe_allow_html=True)
 
     st.markdown('<div class="login-form">', unsafe_allow_html=True)
@@ -703,20 +481,55 @@ elif st.session_state.page == "login":
         st.markdown('</div>', unsafe_allow_html=True)
 
         if submit:
-            if check_login(username, password):
+            try:
+                user_id = auth.login(username, password)
+            except auth.AuthBusyError as e:
+                user_id = None
+                st.markdown(f'<div class="error-message">❌ {e}</div>', unsafe_allow_html=True)
+            if user_id is not None:
                 st.session_state.logged_in = True
                 st.session_state.username = username
+                if remember_me:
+                    token = auth.create_session(user_id)
+                    st.session_state.session_token = token
+                    st.session_state.pending_cookie = (token, auth.SESSION_DAYS * 86400)
                 st.session_state.page = "demo"
                 st.rerun()
 
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
-elif st.session_state.page == "demo":
+
+
+@fragment
+def demo_page():
     if not st.session_state.logged_in:
         st.warning("⚠️ Vui lòng đăng nhập để sử dụng AI Demo.")
         st.stop()
 
+    import cv2
+
+    import detection_store
+    import uploads
+    from batch_upload import BATCH_SIZE, HAS_PARQUET, run_batch
+    from batch_upload import output_path as batch_output_path
+    from detection_store import DetectionRecorder
+    from detections import from_result
+    from onnx_engine import ENGINES, int8_paths
+    from renderer import Renderer
+    from result_cache import weights_hash
+    from tiling import TILE_OVERLAP, TILE_SIZE, tiled_predict
+    from tracker import evaluate_stride
+    from video_pipeline import (PREVIEW_EVERY, PREVIEW_WIDTH, VideoWriterThread, cached_output, output_path,
+                                process_video, video_info)
+
+    model_registry = get_model_registry()
+    result_cache = get_result_cache()
+    sweep_uploads()
+    if "session_files" not in st.session_state:
+        # File tạm của phiên, tự xoá khi phiên kết thúc
+        st.session_state.session_files = uploads.SessionFiles()
+
     st.markdown('<div class="content-card">', unsafe_allow_html=True)
 
     st.markdown('<div class="demo-header">', unsafe_allow_html=True)
@@ -727,58 +540,384 @@ elif st.session_state.page == "demo":
         f'<div class="user-info">Xin chào **{st.session_state.username}** 👋. Bắt đầu trải nghiệm YOLO AI!</div>',
         unsafe_allow_html=True)
 
-    option = st.radio("Chọn chế độ:", ["📤 Upload Ảnh/Video", "📸 Webcam"], horizontal=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        model_name = st.selectbox("🧠 Chọn model", model_registry.names())
+    with col2:
+        engine = st.selectbox("⚙️ Engine", list(ENGINES), format_func=ENGINES.get)
+    model_path = model_registry.path(model_name)
+    use_server = st.checkbox("🔀 Dùng inference server chung (gom batch giữa các phiên)")
+    if use_server:
+        model = load_inference_server(model_path, engine)
+    else:
+        model = load_model(model_name, engine)
+    if model is None:
+        st.stop()
+    # Kết quả cache phụ thuộc cả trọng số lẫn engine
+    model_hash = weights_hash(model_path) + engine
+    if engine == "int8":
+        # quantize.py có thể tạo lại <name>.int8.onnx (calibration / mode khác) cho cùng file .pt
+        model_hash += weights_hash(int8_paths(model_path)[0])
+
+    show_stats = st.checkbox("📈 Đo thời gian từng bước xử lý")
+    # Việc thu thập là của cả process: checkbox chỉ bật được, không bao giờ tắt
+    # (tắt sẽ làm mất số liệu của YOLO_METRICS / METRICS_PORT và của các phiên khác)
+    if show_stats and not metrics.ENABLED:
+        metrics.enable()
+
+    with st.expander("📦 Model đang nạp"):
+        st.table(model_registry.stats())
+        if use_server:
+            st.json(model.stats())
+
+    option = st.radio("Chọn chế độ:", ["📤 Upload Ảnh/Video", "🗂️ Xử lý hàng loạt", "📸 Webcam"], horizontal=True)
 
     if option == "📤 Upload Ảnh/Video":
         uploaded_file = st.file_uploader("Chọn ảnh hoặc video", type=["jpg", "jpeg", "png", "mp4", "avi"])
         if uploaded_file is not None:
             if uploaded_file.type.startswith("image"):
-                image = Image.open(uploaded_file).convert("RGB")
-                results = model(image)
-                st.image(results[0].plot(), caption="Kết quả YOLO", use_column_width=True)
+                use_tiles = st.checkbox("🧩 Chia ảnh thành tile (vật thể nhỏ trong ảnh 4K/drone)")
+                if use_tiles:
+                    col_tile, col_overlap = st.columns(2)
+                    with col_tile:
+                        tile_size = st.select_slider("Kích thước tile", options=[320, 480, 640, 800, 1024],
+                                                     value=TILE_SIZE)
+                    with col_overlap:
+                        overlap = st.slider("Độ chồng lấn", min_value=0.0, max_value=0.5, value=TILE_OVERLAP,
+                                            step=0.05)
+                start = time.perf_counter()
+                # Kết quả tile khác kết quả thường: tham số tile nằm trong khoá cache
+                image_hash = model_hash + (f":tile{tile_size}-{overlap}" if use_tiles else "")
+                key = uploads.upload_key(uploaded_file, image_hash, st.session_state.upload_keys)
+                with metrics.stage("image", "cache_lookup"):
+                    cached = result_cache.get(key)
+                if cached is not None:
+                    dets, entry = cached
+                else:
+                    with metrics.stage("image", "decode"):
+                        image = uploads.decode_image(uploaded_file)
+                    with metrics.stage("image", "model"):
+                        if use_tiles:
+                            results = [tiled_predict(model, image, tile_size, overlap)]
+                        else:
+                            results = model(image)
+                    metrics.observe_result("image", results[0])
+                    dets = from_result(results[0])
+                    with metrics.stage("image", "plot"):
+                        annotated = Renderer(model.names).render_result(results[0], dets)
+                    with metrics.stage("image", "cache_write"):
+                        with uploaded_file.getbuffer() as data:
+                            entry = result_cache.put(key, data, dets, annotated)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+
+                # Chỉ ghi vào bảng uploads một lần cho mỗi file, không ghi lại mỗi lần rerun
+                if key not in st.session_state.recorded_uploads:
+                    db.add_upload(db.get_user_id(st.session_state.username), uploaded_file.name,
+                                  os.path.join(entry, "source"), uploaded_file.type,
+                                  os.path.join(entry, "annotated.jpg"), detections=dets, names=model.names)
+                    st.session_state.recorded_uploads.add(key)
+
+                with metrics.stage("image", "display"):
+                    st.image(os.path.join(entry, "annotated.jpg"), caption="Kết quả YOLO", use_column_width=True)
+                st.caption(f"{'⚡ Lấy từ cache' if cached is not None else '🧠 Đã chạy YOLO'} trong {elapsed_ms:.0f} ms")
             elif uploaded_file.type.startswith("video"):
-                tfile = tempfile.NamedTemporaryFile(delete=False)
-                tfile.write(uploaded_file.read())
-                cap = cv2.VideoCapture(tfile.name)
+                video_key = uploads.upload_key(uploaded_file, model_hash, st.session_state.upload_keys)
+                # Ghi video ra đĩa theo từng khối, không tạo thêm bản sao trong RAM
+                video_path = st.session_state.session_files.spool(uploaded_file, video_key)
                 stframe = st.empty()
-                while cap.isOpened():
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    results = model(frame)
-                    annotated = results[0].plot()
-                    stframe.image(annotated, channels="BGR", use_column_width=True)
-                cap.release()
-            elif st.session_state.page == "demo" and option == "📸 Webcam":
-                st.write("Bật camera realtime phát hiện vật thể 🎥")
-
-                webrtc_streamer(
-                    key="yolo-demo",
-                    video_processor_factory=YOLOProcessor,
-                    media_stream_constraints={"video": True, "audio": False}
-                )
-
+                show_frame = lambda annotated, _: stframe.image(annotated, channels="BGR", use_column_width=True)
+                base_name = os.path.splitext(uploaded_file.name)[0]
+
+                stored = detection_store.load(video_key)
+                if stored is not None:
+                    # Video đã xử lý: đổi ngưỡng, xuất CSV và phát lại từ detection đã lưu, không chạy YOLO
+                    st.info(f"💾 Đã có {len(stored.frame)} detection lưu sẵn cho {stored.frame_count} frame")
+                    conf = st.slider("Ngưỡng confidence", min_value=0.0, max_value=1.0, value=0.25, step=0.05)
+                    st.download_button("⬇️ Xuất detection (CSV)", stored.to_dataframe(conf).to_csv(index=False),
+                                       file_name=f"{base_name}_detections.csv", mime="text/csv")
+                    if st.button("▶️ Phát lại"):
+                        detection_store.replay(video_path, stored, conf, on_frame=show_frame)
+
+                batch_size = st.slider("Số frame mỗi batch", min_value=1, max_value=32, value=8)
+                stride = st.slider("Chạy YOLO mỗi K frame (tracker nội suy các frame bỏ qua)",
+                                   min_value=1, max_value=10, value=1)
+                measure_accuracy = stride > 1 and st.checkbox("Đo độ chính xác so với chạy YOLO mọi frame")
+                live_view = st.checkbox("Hiển thị từng frame trong lúc xử lý (chậm hơn)", value=False)
+                col_labels, col_scale = st.columns(2)
+                with col_labels:
+                    show_labels = st.checkbox("Vẽ nhãn class", value=True)
+                with col_scale:
+                    draw_scale = st.select_slider("Độ phân giải video kết quả", options=[0.25, 0.5, 1.0],
+                                                  value=1.0, format_func=lambda v: f"{v:.0%}")
+
+                # File MP4 phụ thuộc stride / nhãn / độ phân giải: các tham số này nằm trong khoá
+                result_key = f"{video_key}-k{stride}-{'l' if show_labels else 'b'}{int(draw_scale * 100)}"
+                result_file = output_path(result_key)
+                finished = cached_output(result_key)
+
+                # Chỉ xử lý khi bấm nút: rerun do tải file hay đổi tham số không chạy lại cả video
+                if st.button("🔁 Xử lý lại" if finished else "▶️ Xử lý"):
+                    fps, total_frames, width, height = video_info(video_path)
+                    width, height = int(width * draw_scale), int(height * draw_scale)
+                    try:
+                        writer = VideoWriterThread(result_file, fps, (width, height))
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                        st.stop()
+                    progress = st.progress(0.0, text="Đang xử lý video...")
+
+                    def on_frame(annotated, index):
+                        writer.write(annotated)
+                        if live_view:
+                            show_frame(annotated, index)
+                            return
+                        # Chỉ cập nhật progress và preview nhỏ thỉnh thoảng, không đẩy mọi frame lên UI
+                        if index % 10 == 0 and total_frames:
+                            progress.progress(min(index / total_frames, 1.0), text=f"Frame {index}/{total_frames}")
+                        if index % PREVIEW_EVERY == 0:
+                            preview = cv2.resize(annotated, (PREVIEW_WIDTH, PREVIEW_WIDTH * height // max(width, 1)))
+                            stframe.image(preview, channels="BGR")
+
+                    renderer = Renderer(model.names, labels=show_labels, scale=draw_scale)
+                    recorder = DetectionRecorder()
+                    try:
+                        if stored is not None and stride == 1:
+                            # Đã có detection của mọi frame: chỉ vẽ lại với tham số mới, không chạy YOLO
+                            start = time.perf_counter()
+                            frames = detection_store.replay(video_path, stored, on_frame=on_frame, renderer=renderer)
+                            elapsed = time.perf_counter() - start
+                            stats = {"frames": frames, "seconds": elapsed, "fps": frames / elapsed if elapsed else 0.0,
+                                     "detector_calls": 0}
+                        else:
+                            stats = process_video(model, video_path, batch_size=batch_size, stride=stride,
+                                                  on_frame=on_frame, recorder=recorder, renderer=renderer)
+                        with st.spinner("Đang hoàn tất file MP4..."):
+                            finished = writer.close()
+                    finally:
+                        # Lỗi giữa chừng (hoặc st.stop/rerun): dừng luồng ghi và xoá file .part.mp4
+                        writer.abort()
+                    progress.progress(1.0, text="Hoàn tất")
+
+                    if stats["detector_calls"]:
+                        # Chỉ lưu để phát lại khi có detection của mọi frame (stride 1)
+                        if stride == 1:
+                            recorder.save(detection_store.store_path(video_key), model.names)
+                        if video_key not in st.session_state.recorded_uploads:
+                            frames, *video_dets = recorder.arrays()
+                            db.add_upload(db.get_user_id(st.session_state.username), uploaded_file.name,
+                                          video_path, uploaded_file.type, result_file,
+                                          detections=tuple(video_dets), names=model.names, frames=frames)
+                            st.session_state.recorded_uploads.add(video_key)
+
+                    report = None
+                    if measure_accuracy:
+                        with st.spinner("Đang so sánh với baseline chạy mọi frame..."):
+                            report = evaluate_stride(model, video_path, stride)
+                    st.session_state.video_result = {"key": result_key, "stats": stats, "report": report}
+
+                # Kết quả lần xử lý gần nhất được giữ trong session_state qua các lần rerun
+                result = st.session_state.get("video_result")
+                if result is not None and result["key"] == result_key:
+                    stats, report = result["stats"], result["report"]
+                    st.success(f"⚡ Đã xử lý {stats['frames']} frame trong {stats['seconds']:.1f}s "
+                               f"({stats['fps']:.1f} FPS, {stats['detector_calls']} lần chạy YOLO)")
+                    if report is not None:
+                        st.info(f"📊 Stride {report['stride']}: recall {report['recall']:.1%}, "
+                                f"precision {report['precision']:.1%}, F1 {report['f1']:.1%} — "
+                                f"tiết kiệm {report['saved_calls']:.0%} lần chạy YOLO")
+                if finished:
+                    with open(finished, "rb") as f:
+                        st.download_button("⬇️ Tải video kết quả (MP4)", f, mime="video/mp4",
+                                           file_name=f"{base_name}_yolo.mp4")
+
+    elif option == "🗂️ Xử lý hàng loạt":
+        files = st.file_uploader("Chọn nhiều ảnh", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+        batch_size = st.slider("Số ảnh mỗi batch", min_value=1, max_value=32, value=BATCH_SIZE)
+        show_labels = st.checkbox("Vẽ nhãn class", value=True)
+        # Chữ ký của lần chọn file hiện tại: bấm nút tải xuống (rerun) không chạy lại cả batch
+        signature = (tuple((f.name, f.size) for f in files), model_hash, batch_size, show_labels)
+
+        if files and st.button(f"🚀 Xử lý {len(files)} ảnh"):
+            user_id = db.get_user_id(st.session_state.username)
+            # ZIP nằm trong cache/batches (giữ qua các phiên, dọn theo dung lượng) để đường dẫn lưu trong DB
+            # vẫn còn dùng được sau khi phiên kết thúc
+            zip_path = batch_output_path()
+            progress = st.progress(0.0, text="Đang xử lý...")
+            status = st.empty()
+            failed = []
+
+            def on_progress(done, total, name, dets):
+                if dets is None:
+                    failed.append(name)
+                progress.progress(done / total, text=f"{done}/{total} ảnh")
+                status.caption(f"❌ {name}: không đọc được ảnh" if dets is None
+                               else f"✅ {name}: {len(dets[0])} đối tượng")
+
+            start = time.perf_counter()
+            try:
+                detections_df, written = run_batch(model, files, zip_path,
+                                                   Renderer(model.names, labels=show_labels),
+                                                   batch_size=batch_size, on_progress=on_progress)
+            except Exception as e:
+                progress.empty()
+                st.error(f"❌ Xử lý hàng loạt thất bại: {e}")
+                st.stop()
+            elapsed = time.perf_counter() - start
+
+            # Ghi mọi file của batch trong một transaction
+            # Ảnh kết quả là một mục trong ZIP, không phải file riêng: result_path trỏ tới chính file ZIP
+            db.add_uploads([(user_id, name, zip_path, "image/batch", zip_path) for name, _, _ in written],
+                           detections=[dets for _, _, dets in written], names=model.names)
+
+            st.session_state.batch_result = (signature, zip_path, detections_df, len(written), failed, elapsed)
+
+        batch_result = st.session_state.get("batch_result")
+        if files and batch_result is not None and batch_result[0] == signature and os.path.exists(batch_result[1]):
+            _, zip_path, detections_df, done, failed, elapsed = batch_result
+            st.success(f"⚡ Đã xử lý {done} ảnh trong {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f} ảnh/s), "
+                       f"{len(detections_df)} đối tượng")
+            if failed:
+                st.warning(f"Không đọc được {len(failed)} file: {', '.join(failed)}")
+            st.dataframe(detections_df.groupby("class_name").size().rename("số lượng"))
+            col_zip, col_csv, col_parquet = st.columns(3)
+            with col_zip, open(zip_path, "rb") as f:
+                st.download_button("⬇️ Ảnh kết quả (ZIP)", f, file_name="yolo_batch.zip", mime="application/zip")
+            with col_csv:
+                st.download_button("⬇️ Detection (CSV)", detections_df.to_csv(index=False),
+                                   file_name="yolo_batch.csv", mime="text/csv")
+            if HAS_PARQUET:
+                with col_parquet:
+                    st.download_button("⬇️ Detection (Parquet)", detections_df.to_parquet(index=False),
+                                       file_name="yolo_batch.parquet", mime="application/octet-stream")
+
+    elif option == "📸 Webcam":
+        from streamlit_webrtc import webrtc_streamer
+
+        from webcam import MotionGate, YOLOProcessor
+
+        st.write("Bật camera realtime phát hiện vật thể 🎥")
+
+        # Camera cố định: bỏ qua YOLO khi khung hình gần như không đổi
+        use_gate = st.checkbox("🎯 Chỉ chạy YOLO khi có chuyển động", value=True)
+        if use_gate:
+            col1, col2 = st.columns(2)
+            with col1:
+                min_changed = st.slider("Ngưỡng thay đổi (% điểm ảnh)", min_value=0.1, max_value=10.0,
+                                        value=0.5, step=0.1) / 100
+            with col2:
+                max_skip = st.slider("Bỏ qua tối đa (frame liên tiếp)", min_value=1, max_value=300, value=30)
+            make_gate = lambda: MotionGate(min_changed=min_changed, max_skip=max_skip)
+        else:
+            make_gate = lambda: None
+
+        ctx = webrtc_streamer(
+            key="yolo-demo",
+            video_processor_factory=lambda: YOLOProcessor(model, motion_gate=make_gate()),
+            media_stream_constraints={"video": True, "audio": False}
+        )
+        if ctx.video_processor:
+            # Áp dụng cấu hình mới cho stream đang chạy
+            gate = ctx.video_processor.motion_gate
+            if gate is None or not use_gate:
+                ctx.video_processor.motion_gate = make_gate()
+            else:
+                gate.min_changed, gate.max_skip = min_changed, max_skip
+
+        if ctx.video_processor and st.button("📊 Cập nhật thống kê frame"):
+            counters = ctx.video_processor.stats()
+            col1, col2, col3, col4, col5, col6 = st.columns(6)
+            col1.metric("Nhận", counters["received"])
+            col2.metric("Đã xử lý", counters["processed"])
+            col3.metric("Bỏ qua", counters["dropped"])
+            col4.metric("Không đổi", f"{counters['skip_ratio']:.0%}")
+            col5.metric("Inference (ms)", counters["infer_ms"])
+            col6.metric("Lỗi", counters["errors"])
+            if counters["last_error"]:
+                st.warning(f"⚠️ Lỗi inference gần nhất: {counters['last_error']}")
+
+    if show_stats:
+        st.markdown("---")
+        st.markdown("### 📈 Thống kê hiệu năng")
+        stage_rows, fps = metrics.snapshot()
+        if fps:
+            for col, (path, value) in zip(st.columns(len(fps)), sorted(fps.items())):
+                col.metric(f"FPS {path}", f"{value:.1f}")
+        if stage_rows:
+            st.dataframe(stage_rows, use_container_width=True)
+        hashing = auth.metrics()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hàng đợi bcrypt", hashing["queue_depth"])
+        col2.metric("bcrypt p50 (ms)", f"{hashing['latency_p50_ms']:.0f}")
+        col3.metric("bcrypt p95 (ms)", f"{hashing['latency_p95_ms']:.0f}")
+        col4.metric("bcrypt p99 (ms)", f"{hashing['latency_p99_ms']:.0f}")
+        st.download_button("⬇️ Xuất Prometheus (metrics.prom)", metrics.render_prometheus(),
+                           file_name="metrics.prom", mime="text/plain")
 
-class YOLOProcessor(VideoProcessorBase):
-    def __init__(self):
-        self.model = model  # dùng model YOLO đã load ở trên
 
-    def recv(self, frame):
-        img = frame.to_ndarray(format="bgr24")
 
-        # Chạy YOLO
-        results = self.model(img)
-        annotated = results[0].plot()
+@fragment
+def history_page():
+    if not st.session_state.logged_in:
+        st.warning("⚠️ Vui lòng đăng nhập để xem lịch sử.")
+        st.stop()
 
-        # Trả lại frame sau khi detect
-        return av.VideoFrame.from_ndarray(annotated, format="bgr24")
+    import pandas as pd
 
+    st.markdown('<div class="content-card">', unsafe_allow_html=True)
+    st.markdown("# 📊 Lịch sử & thống kê")
+    user_id = db.get_user_id(st.session_state.username)
+
+    # Thống kê đọc từ bảng rollup detection_daily, không quét bảng detections
+    col1, col2 = st.columns(2)
+    with col1:
+        days = st.select_slider("Khoảng thời gian", options=[7, 30, 90, 365], value=30,
+                                format_func=lambda d: f"{d} ngày")
+    with col2:
+        scope = st.radio("Phạm vi", ["Của tôi", "Tất cả người dùng"], horizontal=True)
+    counts = pd.DataFrame(db.class_counts(user_id if scope == "Của tôi" else None, days),
+                          columns=["day", "class_name", "count"])
+    if counts.empty:
+        st.info("Chưa có detection nào trong khoảng thời gian này.")
+    else:
+        st.markdown("### Số đối tượng theo ngày")
+        st.line_chart(counts.pivot_table(index="day", columns="class_name", values="count", fill_value=0))
+        st.markdown("### Tổng theo class")
+        st.bar_chart(counts.groupby("class_name")["count"].sum().sort_values(ascending=False))
+
+    # Phân trang keyset: lưu cursor của các trang đã xem để quay lại
+    st.markdown("### Lịch sử upload")
+    if "history_cursors" not in st.session_state:
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.history_cursors
+    rows, next_cursor = db.upload_history(user_id, cursors[-1])
+    if rows:
+        st.dataframe(pd.DataFrame(rows, columns=["ID", "File", "Loại", "Số đối tượng", "Kết quả", "Thời gian"]),
+                     use_container_width=True, hide_index=True)
+    else:
+        st.info("Chưa có upload nào.")
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    # Đổi trang trong callback: chạy trước khi fragment vẽ lại, không cần st.rerun()
+    with col_prev:
+        if len(cursors) > 1:
+            st.button("⬅️ Trang trước", on_click=cursors.pop)
+    with col_page:
+        st.caption(f"Trang {len(cursors)}")
+    with col_next:
+        if next_cursor is not None:
+            st.button("Trang sau ➡️", on_click=cursors.append, args=(next_cursor,))
+
+
+PAGES = {
+    "home": home_page,
+    "contact": contact_page,
+    "signup": signup_page,
+    "login": login_page,
+    "demo": demo_page,
+    "history": history_page,
+}
+PAGES[st.session_state.page]()
 
 st.markdown('</div>', unsafe_allow_html=True)
 
 # ================= FOOTER =================
-st.markdown("""
-<div class="footer">
-    <div class="footer-text">© 2025 YOLO AI Vision | Developed by HAUI_SuperModel</div>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(FOOTER_HTML, unsafe_allow_html=True)
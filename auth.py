@@ -0,0 +1,316 @@
+import collections
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+import db
+import metrics as app_metrics
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_LIMIT = int(os.environ.get("AUTH_HASH_QUEUE", "64"))
+HASH_WAIT_TIMEOUT = 10.0
+
+SESSION_DAYS = int(os.environ.get("AUTH_SESSION_DAYS", "30"))
+SESSION_CACHE_SIZE = int(os.environ.get("AUTH_SESSION_CACHE_SIZE", "50000"))
+# Thu hồi token ở process khác có hiệu lực sau tối đa chừng này giây
+SESSION_CACHE_TTL = float(os.environ.get("AUTH_SESSION_CACHE_TTL", "60"))
+SECRET_FILE = os.environ.get("AUTH_SECRET_FILE", ".auth_secret")
+
+
+class AuthBusyError(Exception):
+    """Raised when the hashing queue is full for longer than HASH_WAIT_TIMEOUT"""
+
+
+# ================= HASHING SERVICE =================
+class HashingService:
+    """Runs bcrypt on a bounded worker pool so it never blocks script threads unboundedly.
+
+    At most workers + queue_limit jobs are in flight; callers beyond that wait
+    up to HASH_WAIT_TIMEOUT for a slot and then get AuthBusyError.
+    bcrypt releases the GIL, so the workers hash in parallel.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, queue_limit=HASH_QUEUE_LIMIT, rounds=BCRYPT_ROUNDS):
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._latencies = collections.deque(maxlen=1024)
+        self._completed = 0
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(timeout=HASH_WAIT_TIMEOUT):
+            raise AuthBusyError("Hệ thống đang bận, vui lòng thử lại!")
+        with self._lock:
+            self._queued += 1
+        submitted = time.perf_counter()
+
+        def job():
+            with self._lock:
+                self._queued -= 1
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._latencies.append(time.perf_counter() - submitted)
+                    self._completed += 1
+                self._slots.release()
+
+        try:
+            future = self._executor.submit(job)
+        except RuntimeError:
+            # Executor đã shutdown: trả slot lại
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+        return future.result()
+
+    def hash(self, password):
+        return self._submit(
+            lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds)).decode())
+
+    def check(self, password, stored_hash):
+        return self._submit(lambda: bcrypt.checkpw(password.encode(), stored_hash.encode()))
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            queued = self._queued
+            completed = self._completed
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+        return {
+            "queue_depth": queued,
+            "completed": completed,
+            "latency_p50_ms": pct(0.50),
+            "latency_p95_ms": pct(0.95),
+            "latency_p99_ms": pct(0.99),
+            "rounds": self.rounds,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = HashingService()
+        return _service
+
+
+def _is_legacy_hash(stored_hash):
+    # Hash cũ của app.py: SHA-256 hex không salt
+    return not stored_hash.startswith("$2")
+
+
+# ================= REGISTER / LOGIN =================
+def register(username, email, password):
+    if not username or not email or not password:
+        return False, "Vui lòng nhập đầy đủ thông tin!"
+
+    if len(password) < 6:
+        return False, "Mật khẩu phải có ít nhất 6 ký tự!"
+
+    password_hash = get_service().hash(password)
+    if db.insert_user(username, password_hash, email):
+        return True, "Đăng ký thành công!"
+    return False, "Tên đăng nhập hoặc email đã tồn tại!"
+
+
+def login(username, password):
+    """Return the user id on success, None otherwise.
+
+    Legacy SHA-256 hashes are verified once and then replaced with bcrypt.
+    """
+    if not username or not password:
+        return None
+
+    row = db.get_credentials(username)
+    if row is None:
+        return None
+    user_id, stored_hash = row
+
+    if _is_legacy_hash(stored_hash):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        ok = hmac.compare_digest(legacy, stored_hash)
+        if ok:
+            db.update_password_hash(user_id, stored_hash, get_service().hash(password))
+    else:
+        ok = get_service().check(password, stored_hash)
+
+    db.log_login(user_id, ok)
+    return user_id if ok else None
+
+
+def metrics():
+    return get_service().metrics()
+
+
+def _prometheus_lines():
+    # Chỉ báo cáo khi pool đã được tạo, không khởi tạo pool chỉ để xuất metrics
+    if _service is None:
+        return []
+    m = _service.metrics()
+    lines = [
+        "# HELP auth_hash_queue_depth bcrypt jobs waiting for a hashing worker.",
+        "# TYPE auth_hash_queue_depth gauge",
+        f"auth_hash_queue_depth {m['queue_depth']}",
+        "# HELP auth_hash_completed_total bcrypt jobs finished since start.",
+        "# TYPE auth_hash_completed_total counter",
+        f"auth_hash_completed_total {m['completed']}",
+        "# HELP auth_hash_latency_seconds bcrypt latency (queue wait + hashing) over the last 1024 jobs.",
+        "# TYPE auth_hash_latency_seconds summary",
+    ]
+    for quantile, key in ((0.5, "latency_p50_ms"), (0.95, "latency_p95_ms"), (0.99, "latency_p99_ms")):
+        lines.append(f'auth_hash_latency_seconds{{quantile="{quantile}"}} {m[key] / 1000}')
+    return lines
+
+
+app_metrics.register_collector(_prometheus_lines)
+
+
+# ================= REMEMBER-ME SESSIONS =================
+class TTLCache:
+    """Thread-safe LRU map whose entries also expire; at most max_size entries are kept"""
+
+    def __init__(self, max_size=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, ttl=None):
+        expires = time.monotonic() + min(self.ttl, ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+_session_cache = TTLCache()
+_secret = None
+_secret_lock = threading.Lock()
+
+
+def _secret_key():
+    """HMAC key from AUTH_SECRET, else from SECRET_FILE (created on first use)"""
+    global _secret
+    with _secret_lock:
+        if _secret is None:
+            if os.environ.get("AUTH_SECRET"):
+                _secret = os.environ["AUTH_SECRET"].encode()
+            elif os.path.exists(SECRET_FILE):
+                with open(SECRET_FILE, "rb") as f:
+                    _secret = f.read()
+            else:
+                _secret = _create_secret_file()
+        return _secret
+
+
+def _create_secret_file():
+    # Ghi ra file tạm rồi os.link: file bí mật chỉ xuất hiện khi đã ghi đủ. Nếu process khác
+    # tạo trước (FileExistsError) thì dùng khoá của nó để token hai bên khớp nhau
+    key = secrets.token_bytes(32)
+    tmp = f"{SECRET_FILE}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        os.link(tmp, SECRET_FILE)
+    except FileExistsError:
+        with open(SECRET_FILE, "rb") as f:
+            key = f.read()
+    finally:
+        os.remove(tmp)
+    return key
+
+
+def _sign(payload):
+    return hmac.new(_secret_key(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_session(user_id, days=SESSION_DAYS):
+    """Issue a signed "<random>.<expires>.<hmac>" token and store its hash in the sessions table"""
+    expires = int(time.time() + days * 86400)
+    payload = f"{secrets.token_urlsafe(32)}.{expires}"
+    token = f"{payload}.{_sign(payload)}"
+    db.create_session(_token_hash(token), user_id, expires)
+    return token
+
+
+def validate_session(token):
+    """Return (user_id, username) for a valid token, None otherwise; never touches bcrypt.
+
+    Forged or expired tokens are rejected from the signature alone; valid ones
+    are served from the TTL cache and hit SQLite (a primary-key lookup) only
+    on a miss.
+    """
+    try:
+        payload, signature = token.rsplit(".", 1)
+        expires = int(payload.rsplit(".", 1)[1])
+    except (AttributeError, ValueError, IndexError):
+        return None
+    if not hmac.compare_digest(_sign(payload), signature) or expires <= time.time():
+        return None
+
+    key = _token_hash(token)
+    user = _session_cache.get(key)
+    if user is not None:
+        return user
+    row = db.get_session(key)
+    if row is None:
+        return None
+    user_id, username, expires_at = row
+    user = (user_id, username)
+    _session_cache.put(key, user, ttl=expires_at - time.time())
+    return user
+
+
+def revoke_session(token):
+    key = _token_hash(token)
+    _session_cache.pop(key)
+    db.revoke_session(key)
@@ -0,0 +1,129 @@
+import collections
+import importlib.util
+import os
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import pandas as pd
+
+import metrics
+from detections import from_result
+from result_cache import evict_lru
+from uploads import decode_image
+
+OUTPUT_DIR = os.path.join("cache", "batches")
+OUTPUT_MAX_BYTES = 1024 * 1024 * 1024
+BATCH_SIZE = 8
+WORKERS = min(4, os.cpu_count() or 1)
+JPEG_QUALITY = 90
+HAS_PARQUET = importlib.util.find_spec("pyarrow") is not None
+
+
+def _encode(image, quality):
+    # cv2.imencode nhả GIL nên chạy song song được trên pool
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Không mã hoá được ảnh kết quả")
+    return buf
+
+
+def _arcnames(files):
+    """Unique names inside the ZIP, even when two uploads share a file name"""
+    seen = collections.Counter()
+    names = []
+    for f in files:
+        stem, _ = os.path.splitext(os.path.basename(f.name))
+        seen[stem] += 1
+        names.append(f"{stem}.jpg" if seen[stem] == 1 else f"{stem}_{seen[stem]}.jpg")
+    return names
+
+
+def output_path(root=OUTPUT_DIR):
+    """Fresh path for a batch ZIP; the directory outlives sessions and is trimmed by run_batch"""
+    return os.path.join(root, f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.zip")
+
+
+def run_batch(model, files, zip_path, renderer, batch_size=BATCH_SIZE, workers=WORKERS,
+              on_progress=None, jpeg_quality=JPEG_QUALITY, max_bytes=OUTPUT_MAX_BYTES):
+    """Annotate many uploaded images into zip_path.
+
+    A thread pool decodes the next batch while the model runs on the current
+    one, and JPEG-encodes annotated images in the background; at most a few
+    batches are held in memory at once. on_progress(done, total, file_name,
+    detections) is called on the caller's thread after each file. Files that
+    cannot be decoded are reported with detections=None and skipped.
+    If anything raises, the partial ZIP is deleted before the error propagates.
+    Once the ZIP is in place, the oldest files next to it are evicted until
+    the directory is under max_bytes (the new ZIP is always kept).
+    Returns (detections DataFrame, [(file_name, name inside the ZIP, detections)]
+    of the files that were written).
+    """
+    arcnames = _arcnames(files)
+    chunks = [list(range(i, min(i + batch_size, len(files)))) for i in range(0, len(files), batch_size)]
+    rows = []
+    written = []
+    done = 0
+
+    os.makedirs(os.path.dirname(zip_path) or ".", exist_ok=True)
+    tmp = zip_path + ".part"
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool, \
+                zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as archive:
+            decode = lambda chunk: [pool.submit(decode_image, files[i]) for i in chunk]
+            pending_writes = collections.deque()
+
+            def drain(limit):
+                # Ghi vào ZIP theo thứ tự, chỉ giữ tối đa limit ảnh đã mã hoá trong RAM
+                while len(pending_writes) > limit:
+                    name, future = pending_writes.popleft()
+                    with metrics.stage("batch", "zip"):
+                        archive.writestr(name, future.result().tobytes())
+
+            next_decoded = decode(chunks[0]) if chunks else []
+            for n, chunk in enumerate(chunks):
+                with metrics.stage("batch", "decode"):
+                    images = [f.result() for f in next_decoded]
+                if n + 1 < len(chunks):
+                    next_decoded = decode(chunks[n + 1])
+
+                valid = [(i, img) for i, img in zip(chunk, images) if img is not None]
+                with metrics.stage("batch", "model"):
+                    results = model([img for _, img in valid], verbose=False) if valid else []
+                outputs = dict(zip((i for i, _ in valid), results))
+
+                for i in chunk:
+                    result = outputs.get(i)
+                    dets = None
+                    if result is not None:
+                        metrics.observe_result("batch", result)
+                        dets = from_result(result)
+                        with metrics.stage("batch", "plot"):
+                            annotated = renderer.render_result(result, dets)
+                        pending_writes.append((arcnames[i], pool.submit(_encode, annotated, jpeg_quality)))
+                        written.append((files[i].name, arcnames[i], dets))
+                        boxes, classes, scores = dets
+                        for box, cls, score in zip(boxes.tolist(), classes.tolist(), scores.tolist()):
+                            rows.append((files[i].name, arcnames[i], cls, model.names.get(cls, str(cls)),
+                                         score, *box))
+                    done += 1
+                    if on_progress is not None:
+                        on_progress(done, len(files), files[i].name, dets)
+                drain(2 * batch_size)
+            drain(0)
+        os.replace(tmp, zip_path)
+    except BaseException:
+        # Model / encoder lỗi giữa chừng (hoặc rerun): xoá file .part, evict_lru không bao giờ dọn nó
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    evict_lru(os.path.dirname(zip_path) or ".", max_bytes, keep=zip_path)
+
+    df = pd.DataFrame(rows, columns=["file_name", "annotated", "class_id", "class_name", "score",
+                                     "x1", "y1", "x2", "y2"])
+    return df, written
+
@@ -0,0 +1,104 @@
+"""Login load test: N concurrent users hitting auth.login through the bounded hashing pool.
+
+Half of the accounts start with legacy SHA-256 hashes, so the first round also
+exercises the transparent bcrypt upgrade. Afterwards --sessions remember-me
+tokens are issued and validated, cold (SQLite lookup) and warm (TTL cache).
+
+Usage: python benchmarks/bench_auth.py [--users 50] [--rounds 10] [--logins 3] [--sessions 20000]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth  # noqa: E402
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost factor")
+    parser.add_argument("--workers", type=int, default=auth.HASH_WORKERS)
+    parser.add_argument("--logins", type=int, default=3, help="logins per user")
+    parser.add_argument("--sessions", type=int, default=20000, help="remember-me tokens to validate")
+    args = parser.parse_args()
+
+    # Khoá ký token cố định: không tạo file .auth_secret trong thư mục hiện tại
+    os.environ.setdefault("AUTH_SECRET", "bench")
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "auth.db")
+        migrations.migrate()
+        auth._service = auth.HashingService(workers=args.workers, rounds=args.rounds)
+
+        for n in range(args.users):
+            password = f"password{n}"
+            if n % 2:
+                db.insert_user(f"user{n}", hashlib.sha256(password.encode()).hexdigest(), f"user{n}@x")
+            else:
+                auth.register(f"user{n}", f"user{n}@x", password)
+
+        latencies = []
+        failures = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.users)
+
+        def session(n):
+            barrier.wait()
+            for _ in range(args.logins):
+                start = time.perf_counter()
+                ok = auth.login(f"user{n}", f"password{n}") is not None
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if not ok:
+                        failures.append(n)
+
+        threads = [threading.Thread(target=session, args=(n,)) for n in range(args.users)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        upgraded = sum(1 for n in range(1, args.users, 2)
+                       if db.get_credentials(f"user{n}")[1].startswith("$2"))
+        metrics = auth.metrics()
+
+        # Token ghi nhớ đăng nhập: lần đầu tra SQLite, các lần sau lấy từ cache
+        tokens = [auth.create_session(n % args.users + 1) for n in range(args.sessions)]
+        session_latencies = {}
+        for phase in ("cold", "warm"):
+            timings = []
+            for token in tokens:
+                start = time.perf_counter()
+                assert auth.validate_session(token) is not None
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            session_latencies[phase] = timings
+        auth.get_service().shutdown()
+        db.flush_writes()
+        db.get_pool().close()
+
+    latencies.sort()
+    print(f"users={args.users} workers={args.workers} rounds={args.rounds}")
+    print(f"logins/s      {len(latencies) / elapsed:.1f}")
+    print(f"p50 / p95 ms  {latencies[len(latencies) // 2] * 1000:.1f} / "
+          f"{latencies[int(len(latencies) * 0.95)] * 1000:.1f}")
+    print(f"failures      {len(failures)}")
+    print(f"upgraded      {upgraded}/{args.users // 2} legacy hashes")
+    print(f"hash p95 ms   {metrics['latency_p95_ms']:.1f} (includes queue wait)")
+    for phase, timings in session_latencies.items():
+        print(f"session {phase:<5} p50 / p95 us  {timings[len(timings) // 2] * 1e6:.1f} / "
+              f"{timings[int(len(timings) * 0.95)] * 1e6:.1f} ({len(timings)} tokens)")
+
+
+if __name__ == "__main__":
+    main()
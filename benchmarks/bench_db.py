@@ -0,0 +1,114 @@
+"""Concurrency micro-benchmark: connect-per-call SQLite vs the pooled WAL layer and write-behind log in db.py.
+
+Usage: python benchmarks/bench_db.py [--threads 16] [--ops 500]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+
+# Cách cũ: mỗi câu lệnh mở/đóng một connection, journal mặc định
+def _legacy_log_login(path, user_id):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("INSERT INTO login_logs (user_id, success, ip_address) VALUES (?, ?, ?)", (user_id, True, None))
+    conn.commit()
+    conn.close()
+
+
+def _legacy_get_user_id(path, username):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("SELECT id FROM users WHERE username=?", (username,))
+    row = c.fetchone()
+    conn.close()
+    return row
+
+
+def _run(threads, ops, write_op, read_op, finish=None):
+    errors = []
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        local = []
+        for i in range(ops):
+            start = time.perf_counter()
+            try:
+                # 1 ghi / 4 đọc, gần với tỉ lệ thực tế của app
+                if i % 5 == 0:
+                    write_op(1)
+                else:
+                    read_op(f"user{n % 10}")
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if finish is not None:
+        finish()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "ops_per_s": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "locked_errors": len(errors),
+    }
+
+
+def _setup(path):
+    db.DB_NAME = path
+    migrations.migrate()
+    for n in range(10):
+        db.insert_user(f"user{n}", "x" * 60, f"user{n}@example.com")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        _setup(legacy_path)
+        db.get_pool().close()
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        legacy = _run(args.threads, args.ops,
+                      lambda uid: _legacy_log_login(legacy_path, uid),
+                      lambda name: _legacy_get_user_id(legacy_path, name))
+
+        _setup(os.path.join(tmp, "pooled.db"))
+        # log_login đi qua write-behind: flush trong thời gian đo để so sánh công bằng
+        pooled = _run(args.threads, args.ops, lambda uid: db.log_login(uid, True), db.get_user_id,
+                      finish=db.flush_writes)
+        db.get_pool().close()
+
+    print(f"{'mode':<10}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'locked':>8}")
+    for name, r in (("legacy", legacy), ("pooled", pooled)):
+        print(f"{name:<10}{r['ops_per_s']:>10.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['locked_errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
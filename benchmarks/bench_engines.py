@@ -0,0 +1,78 @@
+"""Side-by-side latency and accuracy of the PyTorch, ONNX Runtime and OpenVINO engines.
+
+Accuracy is reported as detection agreement with the PyTorch backend
+(class-aware matches at IoU >= 0.5), which needs no labelled data.
+
+Usage: python benchmarks/bench_engines.py --weights best.pt [--images samples/] [--runs 50]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detections import agreement, from_result  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+from onnx_engine import ENGINES  # noqa: E402
+
+
+def load_images(folder, count):
+    paths = sorted(glob.glob(os.path.join(folder, "*"))) if folder else []
+    images = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    if images:
+        return images[:count]
+    # Không có ảnh mẫu: dùng frame tổng hợp (chỉ có ý nghĩa cho đo tốc độ)
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--images", default=None)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=8)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.runs)
+    registry = ModelRegistry(models={"bench": args.weights}, max_models=1)
+
+    rows = []
+    reference = None
+    for engine in ENGINES:
+        try:
+            model = registry.get("bench", engine)
+        except Exception as e:
+            print(f"{engine}: bỏ qua ({e})")
+            continue
+
+        latencies = []
+        dets = []
+        for image in images:
+            start = time.perf_counter()
+            dets.append(from_result(model(image, verbose=False)[0]))
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(0, len(images), args.batch):
+            model(images[i:i + args.batch], verbose=False)
+        batch_fps = len(images) / (time.perf_counter() - start)
+
+        if reference is None:
+            reference = dets
+        latencies.sort()
+        rows.append((ENGINES[engine], latencies[len(latencies) // 2] * 1000,
+                     latencies[int(len(latencies) * 0.95)] * 1000, batch_fps, agreement(reference, dets)))
+
+    print(f"{'engine':<26}{'p50 ms':>9}{'p95 ms':>9}{'batch fps':>11}{'F1 vs pt':>10}")
+    for name, p50, p95, fps, f1 in rows:
+        print(f"{name:<26}{p50:>9.1f}{p95:>9.1f}{fps:>11.1f}{f1:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
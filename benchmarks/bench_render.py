@@ -0,0 +1,87 @@
+"""Micro-benchmark of the box/label renderers on synthetic detections.
+
+Compares ultralytics Results.plot(), detections.draw and renderer.Renderer
+(with labels, without labels and on a 50% preview) on the same frames, so the
+cost of annotation can be tracked separately from inference. The preview
+timing includes the downscale itself.
+
+Usage: python benchmarks/bench_render.py [--boxes 30] [--frames 200] [--size 1080x1920]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detections import draw  # noqa: E402
+from renderer import Renderer  # noqa: E402
+
+NAMES = {i: f"class_{i}" for i in range(20)}
+
+
+def synthetic(count, boxes, height, width, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(min(count, 8))]
+    dets = []
+    for _ in range(count):
+        xy = rng.uniform(0, [width - 100, height - 100], (boxes, 2))
+        wh = rng.uniform(20, 100, (boxes, 2))
+        dets.append((np.hstack([xy, xy + wh]).astype(np.float32),
+                     rng.integers(0, len(NAMES), boxes).astype(np.int32),
+                     rng.uniform(0.25, 1.0, boxes).astype(np.float32)))
+    return frames, dets
+
+
+def timed(name, fn, frames, dets):
+    # Lượt chạy đầu để cache màu / sprite nhãn đạt trạng thái ổn định như khi xử lý video dài
+    for i, d in enumerate(dets):
+        fn(frames[i % len(frames)].copy(), d)
+    latencies = []
+    for i, d in enumerate(dets):
+        frame = frames[i % len(frames)].copy()
+        start = time.perf_counter()
+        fn(frame, d)
+        latencies.append(time.perf_counter() - start)
+    lat = np.asarray(latencies) * 1000
+    print(f"{name:<22} p50 {np.percentile(lat, 50):7.3f} ms   p95 {np.percentile(lat, 95):7.3f} ms")
+
+
+def ultralytics_plot():
+    try:
+        import torch
+        from ultralytics.engine.results import Results
+    except ImportError:
+        return None
+
+    def plot(frame, d):
+        boxes, classes, scores = d
+        data = torch.from_numpy(np.hstack([boxes, scores[:, None], classes[:, None].astype(np.float32)]))
+        Results(frame, path="", names=NAMES, boxes=data).plot()
+    return plot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--size", default="1080x1920", help="HxW")
+    args = parser.parse_args()
+    height, width = map(int, args.size.split("x"))
+    frames, dets = synthetic(args.frames, args.boxes, height, width)
+
+    plot = ultralytics_plot()
+    if plot is not None:
+        timed("Results.plot()", plot, frames, dets)
+    else:
+        print("ultralytics chưa được cài: bỏ qua Results.plot()")
+    timed("detections.draw", lambda f, d: draw(f, *d, NAMES), frames, dets)
+    timed("Renderer", Renderer(NAMES).render, frames, dets)
+    timed("Renderer (no labels)", Renderer(NAMES, labels=False).render, frames, dets)
+    timed("Renderer (50% preview)", Renderer(NAMES, scale=0.5).render, frames, dets)
+
+
+if __name__ == "__main__":
+    main()
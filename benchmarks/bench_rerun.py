@@ -0,0 +1,60 @@
+"""Server-side rerun time and markdown payload of each page of app.py.
+
+Drives the app headlessly with streamlit.testing.v1.AppTest (no browser) and
+reports the p50/p95 time of a script run and the bytes of markdown the run
+emits, per page. Run it on two commits to compare rerun cost.
+
+Usage: python benchmarks/bench_rerun.py [--runs 20] [--pages home,contact,login,signup,history]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+LOGGED_IN_PAGES = {"demo", "history"}
+
+
+def bench_page(page, runs, timeout):
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    at.session_state["page"] = page
+    if page in LOGGED_IN_PAGES:
+        at.session_state["logged_in"] = True
+        at.session_state["username"] = "bench"
+    # Lần chạy đầu nạp module, cache_resource: không tính vào kết quả
+    at.run()
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(f"Trang {page} lỗi: {at.exception[0].value}")
+    payload = sum(len(m.value.encode()) for m in at.markdown)
+    lat = np.asarray(latencies) * 1000
+    return np.percentile(lat, 50), np.percentile(lat, 95), payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--pages", default="home,contact,login,signup,history")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    # app.db và cache/ được tạo trong thư mục tạm, không đụng vào dữ liệu thật
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        sys.path.insert(0, ROOT)
+        for page in args.pages.split(","):
+            p50, p95, payload = bench_page(page, args.runs, args.timeout)
+            print(f"{page:<8} p50 {p50:7.1f} ms   p95 {p95:7.1f} ms   markdown {payload / 1024:6.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Cold-start cost: import time of the landing-page modules versus the demo-only
+ones, and time-to-first-render of the home page.
+
+Every measurement runs in a fresh interpreter so nothing is already cached in
+sys.modules. Time-to-first-render drives app.py with streamlit's AppTest and
+also lists which heavy modules the home page pulled in (ideally none).
+
+Usage: python benchmarks/bench_startup.py [--repeat 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LANDING = ["streamlit", "auth", "db", "metrics", "migrations"]
+HEAVY = ["cv2", "pandas", "av", "streamlit_webrtc", "torch", "ultralytics"]
+
+IMPORT_SNIPPET = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+out = {{}}
+for name in {modules!r}:
+    start = time.perf_counter()
+    try:
+        importlib.import_module(name)
+        out[name] = round(time.perf_counter() - start, 3)
+    except ImportError:
+        out[name] = None
+print(json.dumps(out))
+"""
+
+RENDER_SNIPPET = """
+import json, os, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({{"first_render_s": round(elapsed, 3),
+                  "error": str(at.exception[0].value) if at.exception else None,
+                  "heavy_loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run(snippet, cwd):
+    result = subprocess.run([sys.executable, "-c", snippet], cwd=cwd, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    report = {"landing_imports_s": [], "demo_imports_s": [], "home_page": []}
+    # Thư mục tạm làm cwd để app.db / cache không ghi vào repo
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(args.repeat):
+            report["landing_imports_s"].append(run(IMPORT_SNIPPET.format(root=ROOT, modules=LANDING), tmp))
+            report["demo_imports_s"].append(run(IMPORT_SNIPPET.format(root=ROOT, modules=HEAVY), tmp))
+            report["home_page"].append(run(RENDER_SNIPPET.format(app=os.path.join(ROOT, "app.py"), heavy=HEAVY),
+                                           tmp))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Latency and recall of tiled inference versus plain model(image).
+
+Recall is measured against YOLO-format labels (<labels>/<image stem>.txt with
+"class cx cy w h" normalised rows) at IoU >= 0.5. Without labels only latency
+and the number of detections are reported.
+
+Usage: python benchmarks/bench_tiling.py --weights best.pt --images samples/ [--labels labels/]
+                                         [--tile 640] [--overlap 0.2] [--runs 3]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detections import from_result, greedy_match  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+from tiling import TILE_OVERLAP, TILE_SIZE, tiled_predict  # noqa: E402
+
+
+def load_labels(path, width, height):
+    if not os.path.exists(path):
+        return None
+    rows = np.loadtxt(path, ndmin=2, dtype=np.float32)
+    if rows.size == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.int32)
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return boxes, rows[:, 0].astype(np.int32)
+
+
+def run(name, predict, images, truths, runs):
+    latencies, matched, total, found = [], 0, 0, 0
+    for image, truth in zip(images, truths):
+        for _ in range(runs):
+            start = time.perf_counter()
+            boxes, classes, _ = predict(image)
+            latencies.append(time.perf_counter() - start)
+        found += len(boxes)
+        if truth is not None:
+            matched += len(greedy_match(truth[0], truth[1], boxes, classes, 0.5))
+            total += len(truth[0])
+    lat = np.asarray(latencies) * 1000
+    recall = f"{matched / total:.1%}" if total else "n/a"
+    print(f"{name:<8} p50 {np.percentile(lat, 50):8.1f} ms   p95 {np.percentile(lat, 95):8.1f} ms   "
+          f"detections {found:6d}   recall {recall}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--engine", default="pytorch")
+    parser.add_argument("--images", required=True)
+    parser.add_argument("--labels", default=None)
+    parser.add_argument("--tile", type=int, default=TILE_SIZE)
+    parser.add_argument("--overlap", type=float, default=TILE_OVERLAP)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.images, "*")))
+    images, truths = [], []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        images.append(image)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        truths.append(load_labels(os.path.join(args.labels, stem + ".txt"), image.shape[1], image.shape[0])
+                      if args.labels else None)
+    if not images:
+        raise SystemExit(f"Không tìm thấy ảnh trong {args.images}")
+
+    model = ModelRegistry(models={"bench": args.weights}, max_models=1).get("bench", args.engine)
+    print(f"{len(images)} ảnh, tile {args.tile}px, overlap {args.overlap:.0%}")
+    run("plain", lambda img: from_result(model(img, verbose=False)[0]), images, truths, args.runs)
+    run("tiled", lambda img: tiled_predict(model, img, args.tile, args.overlap).detections,
+        images, truths, args.runs)
+
+
+if __name__ == "__main__":
+    main()
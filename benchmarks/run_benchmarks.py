@@ -0,0 +1,211 @@
+"""Headless benchmark suite for the hot paths of app.py.
+
+Runs without a browser or Streamlit server on synthetic frames (or a sample
+image/video) and prints one JSON document with p50/p95/p99 latency, throughput
+and peak RSS per benchmark, so runs can be diffed before a deploy.
+
+Usage: python benchmarks/run_benchmarks.py [--weights best.pt] [--engine pytorch]
+                                           [--frames 100] [--only image,video,webcam,db]
+                                           [--output bench.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SEED = 0
+
+
+def _peak_rss_mb():
+    # ru_maxrss: KB trên Linux, byte trên macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _summary(latencies, elapsed, items=None):
+    lat = np.sort(np.asarray(latencies)) * 1000
+    return {
+        "n": len(lat),
+        "p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "p95_ms": round(float(np.percentile(lat, 95)), 3),
+        "p99_ms": round(float(np.percentile(lat, 99)), 3),
+        "throughput_per_s": round((items if items is not None else len(lat)) / elapsed, 2),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _frames(count, size=(720, 1280)):
+    rng = np.random.default_rng(SEED)
+    base = rng.integers(0, 255, (*size, 3), dtype=np.uint8)
+    # Frame dịch chuyển dần để giống video thật thay vì nhiễu ngẫu nhiên mỗi frame
+    return [np.roll(base, i * 4, axis=1) for i in range(count)]
+
+
+def _timed(fn, items):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - start
+
+
+# ================= IMAGE =================
+def bench_image(model, frames):
+    """model(image) + Renderer.render_result, as in the image upload branch (cache miss)"""
+    from renderer import Renderer
+
+    # Renderer mới cho mỗi ảnh, giống app.py: cache sprite nhãn không được dùng lại giữa các upload
+    return _summary(*_timed(lambda f: Renderer(model.names).render_result(model(f, verbose=False)[0]), frames))
+
+
+# ================= VIDEO =================
+def bench_video(model, frames, batch_size):
+    """Decode -> infer -> annotate loop through video_pipeline.process_video"""
+    from video_pipeline import process_video
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.mp4")
+        h, w = frames[0].shape[:2]
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (w, h))
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+
+        latencies = []
+        last = [time.perf_counter()]
+
+        def on_frame(annotated, index):
+            now = time.perf_counter()
+            latencies.append(now - last[0])
+            last[0] = now
+
+        stats = process_video(model, path, batch_size=batch_size, on_frame=on_frame)
+    return _summary(latencies, stats["seconds"], stats["frames"])
+
+
+# ================= WEBCAM =================
+def bench_webcam(model, frames, fps=30, motion_gate=None):
+    """YOLOProcessor.recv with av.VideoFrame round-trips at a simulated camera rate"""
+    import av
+    from webcam import YOLOProcessor
+
+    processor = YOLOProcessor(model, motion_gate=motion_gate)
+    interval = 1 / fps
+    latencies = []
+    start = time.perf_counter()
+    try:
+        for frame in frames:
+            t = time.perf_counter()
+            out = processor.recv(av.VideoFrame.from_ndarray(frame, format="bgr24"))
+            out.to_ndarray(format="bgr24")
+            latencies.append(time.perf_counter() - t)
+            time.sleep(max(0.0, interval - (time.perf_counter() - t)))
+        elapsed = time.perf_counter() - start
+        counters = processor.stats()
+    finally:
+        processor.on_ended()
+
+    result = _summary(latencies, elapsed)
+    result.update(counters)
+    result["inference_fps"] = round(counters["processed"] / elapsed, 2)
+    return result
+
+
+# ================= DB =================
+def bench_db(ops):
+    """auth.register/login and the db.py logging calls against a throwaway database"""
+    import auth
+    import db
+    import migrations
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench.db")
+        migrations.migrate()
+        # Cost factor thấp để đo phần I/O của đường auth, không phải bcrypt
+        auth._service = auth.HashingService(rounds=4)
+
+        users = [f"user{i}" for i in range(ops)]
+        results["auth_register"] = _summary(*_timed(
+            lambda u: auth.register(u, f"{u}@example.com", "password123"), users))
+        results["auth_login"] = _summary(*_timed(lambda u: auth.login(u, "password123"), users))
+
+        results["log_login"] = _summary(*_timed(lambda i: db.log_login(1, True), range(ops)))
+        results["add_upload"] = _summary(*_timed(
+            lambda i: db.add_upload(1, f"f{i}.jpg", f"/tmp/f{i}.jpg", "image/jpeg"), range(ops)))
+        start = time.perf_counter()
+        db.flush_writes()
+        results["flush_writes_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+        auth.get_service().shutdown()
+        auth._service = None
+        db.get_pool().close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--engine", default="pytorch")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--db-ops", type=int, default=200)
+    parser.add_argument("--only", default="image,video,webcam,db")
+    parser.add_argument("--output", default=None, help="ghi JSON ra file thay vì stdout")
+    args = parser.parse_args()
+    only = set(args.only.split(","))
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "weights": args.weights,
+        "engine": args.engine,
+        "frames": args.frames,
+        "results": {},
+    }
+
+    if only & {"image", "video", "webcam"}:
+        from model_registry import ModelRegistry
+
+        start = time.perf_counter()
+        model = ModelRegistry(models={"bench": args.weights}, max_models=1).get("bench", args.engine)
+        report["model_load_s"] = round(time.perf_counter() - start, 3)
+        frames = _frames(args.frames)
+
+        if "image" in only:
+            report["results"]["image"] = bench_image(model, frames)
+        if "video" in only:
+            report["results"]["video"] = bench_video(model, frames, args.batch)
+        if "webcam" in only:
+            from webcam import MotionGate
+
+            report["results"]["webcam"] = bench_webcam(model, frames)
+            # Cảnh tĩnh (camera cố định): motion gate nên bỏ qua gần hết inference
+            report["results"]["webcam_static_gated"] = bench_webcam(model, [frames[0]] * len(frames),
+                                                                    motion_gate=MotionGate())
+
+    if "db" in only:
+        report["results"]["db"] = bench_db(args.db_ops)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,112 +1,402 @@
+import atexit
+import queue
 import sqlite3
-import bcrypt
+import sys
+import threading
+import time
+from contextlib import contextmanager
 
 DB_NAME = "app.db"
+POOL_SIZE = 8
+
 
 # -----------------------------
-# Khởi tạo DB (nếu chưa có)
+# Connection pool (WAL)
 # -----------------------------
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-
-    # Tạo bảng users
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        email TEXT UNIQUE,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # Tạo bảng uploads
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS uploads (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        file_name TEXT NOT NULL,
-        file_path TEXT NOT NULL,
-        file_type TEXT NOT NULL,
-        result_path TEXT,
-        uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    """)
-
-    # Tạo bảng login_logs
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS login_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        login_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-        ip_address TEXT,
-        success BOOLEAN NOT NULL,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    """)
-
-    conn.commit()
-    conn.close()
+class ConnectionPool:
+    """Small LIFO pool of SQLite connections shared across Streamlit script threads.
+
+    Connections are opened once in WAL mode with tuned pragmas; sqlite3's
+    per-connection statement cache keeps the prepared statements alive between calls.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-16000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DB_NAME:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_NAME)
+        return _pool
+
+
+def connection():
+    """Borrow a pooled connection: ``with db.connection() as conn, conn: ...``"""
+    return get_pool().connection()
 
 
 # -----------------------------
-# User: Đăng ký
+# User: Đăng ký / Đăng nhập
+# (băm mật khẩu nằm ở auth.py, ở đây chỉ có SQL)
 # -----------------------------
-def add_user(username, password, email=None):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
+def insert_user(username, password_hash, email=None):
     try:
-        c.execute("INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)",
-                  (username, password_hash, email))
-        conn.commit()
+        with connection() as conn, conn:
+            conn.execute("INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)",
+                         (username, password_hash, email))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
+
+
+def get_credentials(username):
+    """Return (user_id, password_hash) or None"""
+    with connection() as conn:
+        return conn.execute("SELECT id, password_hash FROM users WHERE username=?", (username,)).fetchone()
+
+
+def update_password_hash(user_id, old_hash, new_hash):
+    """Compare-and-swap so two concurrent upgrades of the same legacy hash cannot clash"""
+    with connection() as conn, conn:
+        conn.execute("UPDATE users SET password_hash=? WHERE id=? AND password_hash=?",
+                     (new_hash, user_id, old_hash))
+
+
+def get_user_id(username):
+    with connection() as conn:
+        row = conn.execute("SELECT id FROM users WHERE username=?", (username,)).fetchone()
+    return row[0] if row else None
 
 
 # -----------------------------
-# User: Đăng nhập
+# Sessions: token "ghi nhớ đăng nhập"
 # -----------------------------
-def check_user(username, password):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, password_hash FROM users WHERE username=?", (username,))
-    row = c.fetchone()
-    conn.close()
+def create_session(token_hash, user_id, expires_at):
+    with connection() as conn, conn:
+        conn.execute("INSERT INTO sessions (token_hash, user_id, expires_at) VALUES (?, ?, ?)",
+                     (token_hash, user_id, int(expires_at)))
+
+
+def get_session(token_hash):
+    """Return (user_id, username, expires_at) of a live, unrevoked session or None"""
+    with connection() as conn:
+        return conn.execute(
+            """SELECT s.user_id, u.username, s.expires_at FROM sessions s JOIN users u ON u.id = s.user_id
+               WHERE s.token_hash = ? AND s.revoked = 0 AND s.expires_at > ?""",
+            (token_hash, int(time.time()))).fetchone()
+
+
+def revoke_session(token_hash):
+    with connection() as conn, conn:
+        conn.execute("UPDATE sessions SET revoked = 1 WHERE token_hash = ?", (token_hash,))
+
+
+def purge_sessions():
+    """Delete expired and revoked sessions; returns the number of rows removed"""
+    with connection() as conn, conn:
+        return conn.execute("DELETE FROM sessions WHERE expires_at <= ? OR revoked = 1",
+                            (int(time.time()),)).rowcount
+
+
+# -----------------------------
+# Write-behind: ghi log theo batch
+# -----------------------------
+_INSERT_SQL = {
+    "uploads": """INSERT INTO uploads (user_id, file_name, file_path, file_type, result_path) 
+                  VALUES (?, ?, ?, ?, ?)""",
+    "login_logs": """INSERT INTO login_logs (user_id, success, ip_address) 
+                     VALUES (?, ?, ?)""",
+}
+
+WRITE_BATCH_SIZE = 200
+WRITE_FLUSH_INTERVAL = 0.5
+WRITE_QUEUE_SIZE = 10000
 
-    if row:
-        user_id, stored_hash = row
-        if bcrypt.checkpw(password.encode(), stored_hash.encode()):
-            return user_id
-    return None
+
+class WriteBehindWriter:
+    """Background thread that batches uploads/login_logs inserts into one transaction.
+
+    A batch is flushed when it reaches batch_size rows or flush_interval seconds
+    after its first row, whichever comes first.
+
+    Overflow policy: the queue holds at most queue_size rows. When it is full,
+    submit() writes the row synchronously on the caller's thread instead of
+    dropping it, so a burst slows callers down but never loses an event.
+    If a batch fails (e.g. a NOT NULL violation) its rows are retried one by
+    one and only the offending rows are discarded. Should the thread die anyway,
+    submit() falls back to synchronous writes and flush() returns instead of
+    waiting forever.
+    """
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL,
+                 queue_size=WRITE_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.sync_fallbacks = 0
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, table, row):
+        if self._closed or not self._thread.is_alive():
+            self._write([(table, row)])
+            return
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            self.sync_fallbacks += 1
+            self._write([(table, row)])
+
+    def flush(self):
+        """Block until everything submitted so far is committed"""
+        if self._closed or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        while not done.wait(0.5):
+            if not self._thread.is_alive():
+                print("[db] luồng ghi đã dừng, bỏ qua flush()", file=sys.stderr)
+                return
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+
+            if isinstance(item, tuple) and item:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            # Hết hạn, đủ batch, flush() hoặc close(): ghi những gì đang có
+            if batch:
+                self._write(batch)
+                batch = []
+            deadline = None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _write(self, batch):
+        by_table = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(row)
+        try:
+            with connection() as conn, conn:
+                for table, rows in by_table.items():
+                    conn.executemany(_INSERT_SQL[table], rows)
+            self.rows_written += len(batch)
+        except Exception:
+            # Không chỉ sqlite3.Error: dòng sai kiểu (TypeError...) cũng không được làm chết luồng ghi
+            for table, row in batch:
+                try:
+                    with connection() as conn, conn:
+                        conn.execute(_INSERT_SQL[table], row)
+                    self.rows_written += 1
+                except Exception as e:
+                    self.rows_failed += 1
+                    print(f"[db] bỏ qua dòng {table} lỗi: {e}", file=sys.stderr)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteBehindWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def flush_writes():
+    if _writer is not None:
+        _writer.flush()
 
 
 # -----------------------------
 # Uploads: Lưu file upload
 # -----------------------------
-def add_upload(user_id, file_name, file_path, file_type, result_path=None):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""INSERT INTO uploads (user_id, file_name, file_path, file_type, result_path) 
-                 VALUES (?, ?, ?, ?, ?)""",
-              (user_id, file_name, file_path, file_type, result_path))
-    conn.commit()
-    conn.close()
+def add_upload(user_id, file_name, file_path, file_type, result_path=None, detections=None, names=None,
+               frames=None):
+    """Record an upload.
+
+    Without detections the row goes through the write-behind queue. With
+    detections ((boxes, classes, scores), plus per-row frame indices for videos)
+    the upload, its detections and the daily rollup are written synchronously
+    in one transaction and the new upload id is returned.
+    """
+    row = (user_id, file_name, file_path, file_type, result_path)
+    if detections is None:
+        get_writer().submit("uploads", row)
+        return None
+    with connection() as conn, conn:
+        upload_id = conn.execute(_INSERT_SQL["uploads"], row).lastrowid
+        _insert_detections(conn, upload_id, user_id, detections, names, frames)
+    return upload_id
+
+
+def add_uploads(rows, detections=None, names=None):
+    """Insert many (user_id, file_name, file_path, file_type, result_path) rows in one transaction.
+
+    Written synchronously (not through the write-behind queue) so either the
+    whole batch is recorded or none of it is; detections, if given, is a list
+    aligned with rows. Returns the new upload ids.
+    """
+    with connection() as conn, conn:
+        ids = [conn.execute(_INSERT_SQL["uploads"], row).lastrowid for row in rows]
+        if detections is not None:
+            for upload_id, row, dets in zip(ids, rows, detections):
+                _insert_detections(conn, upload_id, row[0], dets, names)
+    return ids
+
+
+# -----------------------------
+# Detections: Lưu kết quả nhận diện
+# -----------------------------
+def _insert_detections(conn, upload_id, user_id, detections, names=None, frames=None):
+    boxes, classes, scores = detections
+    if len(boxes) == 0:
+        return
+    names = names or {}
+    labels = [names.get(int(c), str(int(c))) for c in classes]
+    frames = frames.tolist() if frames is not None else [0] * len(boxes)
+    conn.executemany(
+        """INSERT INTO detections (upload_id, frame, class_name, score, x1, y1, x2, y2)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        ((upload_id, frame, label, score, *box)
+         for frame, label, score, box in zip(frames, labels, scores.tolist(), boxes.tolist())))
+
+    per_class = {}
+    for label in labels:
+        per_class[label] = per_class.get(label, 0) + 1
+    conn.executemany(
+        """INSERT INTO detection_daily (user_id, day, class_name, count) VALUES (?, date('now'), ?, ?)
+           ON CONFLICT(user_id, day, class_name) DO UPDATE SET count = count + excluded.count""",
+        [(user_id, label, count) for label, count in per_class.items()])
+    conn.execute("UPDATE uploads SET detection_count = ? WHERE id = ?", (len(labels), upload_id))
+
+
+def class_counts(user_id=None, days=30):
+    """(day, class_name, count) rows of the last days days, read from the daily rollup"""
+    with connection() as conn:
+        if user_id is None:
+            return conn.execute(
+                """SELECT day, class_name, SUM(count) FROM detection_daily
+                   WHERE day >= date('now', ?) GROUP BY day, class_name ORDER BY day""",
+                (f"-{int(days)} days",)).fetchall()
+        return conn.execute(
+            """SELECT day, class_name, count FROM detection_daily
+               WHERE user_id = ? AND day >= date('now', ?) ORDER BY day""",
+            (user_id, f"-{int(days)} days")).fetchall()
+
+
+def upload_history(user_id, cursor=None, limit=20):
+    """One page of a user's uploads, newest first, with keyset pagination.
+
+    cursor is the (uploaded_at, id) of the last row of the previous page;
+    returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    with connection() as conn:
+        if cursor is None:
+            rows = conn.execute(
+                """SELECT id, file_name, file_type, detection_count, result_path, uploaded_at FROM uploads
+                   WHERE user_id = ? ORDER BY uploaded_at DESC, id DESC LIMIT ?""",
+                (user_id, limit + 1)).fetchall()
+        else:
+            rows = conn.execute(
+                """SELECT id, file_name, file_type, detection_count, result_path, uploaded_at FROM uploads
+                   WHERE user_id = ? AND (uploaded_at, id) < (?, ?)
+                   ORDER BY uploaded_at DESC, id DESC LIMIT ?""",
+                (user_id, cursor[0], cursor[1], limit + 1)).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1][5], rows[-1][0])
 
 
 # -----------------------------
 # Login logs: Ghi lại log
 # -----------------------------
 def log_login(user_id, success, ip_address=None):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""INSERT INTO login_logs (user_id, success, ip_address) 
-                 VALUES (?, ?, ?)""", (user_id, success, ip_address))
-    conn.commit()
-    conn.close()
+    get_writer().submit("login_logs", (user_id, success, ip_address))
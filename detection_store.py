@@ -0,0 +1,127 @@
+import os
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from renderer import Renderer
+from result_cache import evict_lru
+
+STORE_DIR = os.path.join("cache", "detections")
+STORE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def store_path(key, root=STORE_DIR):
+    """Path of the .npz store for a cache_key(file bytes, weights hash)"""
+    return os.path.join(root, f"{key}.npz")
+
+
+# ================= RECORDING =================
+class DetectionRecorder:
+    """Collects per-frame detections of one video and writes them as a single .npz"""
+
+    def __init__(self):
+        self._frames = []
+        self._boxes = []
+        self._classes = []
+        self._scores = []
+        self.frame_count = 0
+
+    def add(self, index, dets):
+        boxes, classes, scores = dets
+        self._frames.append(np.full(len(boxes), index, dtype=np.int32))
+        self._boxes.append(boxes)
+        self._classes.append(classes)
+        self._scores.append(scores)
+        self.frame_count = max(self.frame_count, index + 1)
+
+    def arrays(self):
+        """(frame, boxes, classes, scores) of every recorded detection, in frame order"""
+        if not self._frames:
+            return (np.zeros(0, np.int32), np.zeros((0, 4), np.float32), np.zeros(0, np.int32),
+                    np.zeros(0, np.float32))
+        return (np.concatenate(self._frames), np.concatenate(self._boxes).astype(np.float32),
+                np.concatenate(self._classes).astype(np.int32), np.concatenate(self._scores).astype(np.float32))
+
+    def save(self, path, names=None, max_bytes=STORE_MAX_BYTES):
+        """Write the .npz atomically, then evict the least recently used stores beyond max_bytes"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        frame, boxes, classes, scores = self.arrays()
+        np.savez_compressed(
+            tmp,
+            frame=frame,
+            boxes=boxes,
+            classes=classes.astype(np.int16),
+            scores=scores.astype(np.float16),
+            frame_count=np.int32(self.frame_count),
+            names=np.array([names[i] for i in sorted(names)] if names else [], dtype=str),
+        )
+        # Đổi tên nguyên tử để không bao giờ đọc phải file ghi dở
+        os.replace(tmp, path)
+        evict_lru(os.path.dirname(path) or ".", max_bytes, keep=path)
+
+
+# ================= READING =================
+class VideoDetections:
+    """Read-only view of a stored .npz; rows are sorted by frame index"""
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.frame = data["frame"]
+            self.boxes = data["boxes"]
+            self.classes = data["classes"].astype(np.int32)
+            self.scores = data["scores"].astype(np.float32)
+            self.frame_count = int(data["frame_count"])
+            self.names = dict(enumerate(data["names"].tolist()))
+        # offsets[i]:offsets[i + 1] là các dòng của frame i
+        self.offsets = np.searchsorted(self.frame, np.arange(self.frame_count + 1))
+
+    def frame_detections(self, index, conf=0.0):
+        lo, hi = self.offsets[index], self.offsets[index + 1]
+        keep = self.scores[lo:hi] >= conf
+        return self.boxes[lo:hi][keep], self.classes[lo:hi][keep], self.scores[lo:hi][keep]
+
+    def to_dataframe(self, conf=0.0):
+        keep = self.scores >= conf
+        return pd.DataFrame({
+            "frame": self.frame[keep],
+            "class_id": self.classes[keep],
+            "class_name": [self.names.get(int(c), str(c)) for c in self.classes[keep]],
+            "score": self.scores[keep],
+            "x1": self.boxes[keep, 0],
+            "y1": self.boxes[keep, 1],
+            "x2": self.boxes[keep, 2],
+            "y2": self.boxes[keep, 3],
+        })
+
+
+def load(key, root=STORE_DIR):
+    """Stored detections for key, or None; a hit refreshes the file mtime for LRU eviction"""
+    path = store_path(key, root)
+    try:
+        stored = VideoDetections(path)
+        os.utime(path)
+    except (OSError, ValueError, KeyError):
+        # Chưa có, hoặc vừa bị evict bởi phiên khác
+        return None
+    return stored
+
+
+def replay(video_path, stored, conf=0.0, on_frame=None, renderer=None):
+    """Re-render a video from stored detections without running the model"""
+    renderer = renderer or Renderer(stored.names)
+    cap = cv2.VideoCapture(video_path)
+    index = 0
+    try:
+        while index < stored.frame_count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            annotated = renderer.render(frame, stored.frame_detections(index, conf))
+            if on_frame is not None:
+                on_frame(annotated, index)
+            index += 1
+    finally:
+        cap.release()
+    return index
@@ -0,0 +1,126 @@
+import cv2
+import numpy as np
+
+
+# ================= RESULT CONVERSION =================
+def from_result(result):
+    """Return (boxes, classes, scores) numpy arrays from an ultralytics Results object"""
+    if hasattr(result, "detections"):
+        # DetectionResult (onnx_engine, inference_server) đã là numpy
+        return result.detections
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return empty()
+    return (
+        boxes.xyxy.cpu().numpy().astype(np.float32),
+        boxes.cls.cpu().numpy().astype(np.int32),
+        boxes.conf.cpu().numpy().astype(np.float32),
+    )
+
+
+def empty():
+    return (
+        np.zeros((0, 4), dtype=np.float32),
+        np.zeros((0,), dtype=np.int32),
+        np.zeros((0,), dtype=np.float32),
+    )
+
+
+def to_bgr(image):
+    """PIL images (RGB, as in the image upload branch) -> BGR numpy; numpy frames pass through"""
+    if isinstance(image, np.ndarray):
+        return image
+    return np.ascontiguousarray(np.asarray(image.convert("RGB"))[..., ::-1])
+
+
+class DetectionResult:
+    """Minimal stand-in for ultralytics Results: numpy detections + plot()"""
+
+    def __init__(self, image, detections, names):
+        self.orig_img = image
+        self.detections = detections
+        self.names = names
+        self.speed = None
+
+    def plot(self):
+        return draw(self.orig_img.copy(), *self.detections, self.names)
+
+
+# ================= GEOMETRY =================
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two (N, 4) and (M, 4) xyxy arrays"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+def nms(boxes, scores, classes, iou_threshold=0.45):
+    """Class-aware NMS; returns the kept indices in descending score order"""
+    if len(boxes) == 0:
+        return np.zeros((0,), dtype=np.int64)
+    # Dịch box theo class để box khác class không bao giờ chồng lên nhau
+    shifted = boxes + (classes.astype(np.float32) * (float(boxes.max()) + 1.0))[:, None]
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter = (np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+                 * np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None))
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def greedy_match(boxes_a, classes_a, boxes_b, classes_b, iou_threshold):
+    """Class-aware greedy IoU matching; returns a list of (index_a, index_b) pairs"""
+    iou = iou_matrix(boxes_a, boxes_b)
+    if iou.size == 0:
+        return []
+    iou = np.where(classes_a[:, None] == classes_b[None, :], iou, 0.0)
+    pairs = []
+    used_a, used_b = set(), set()
+    for flat in np.argsort(-iou, axis=None):
+        i, j = np.unravel_index(flat, iou.shape)
+        if iou[i, j] < iou_threshold:
+            break
+        if i in used_a or j in used_b:
+            continue
+        pairs.append((int(i), int(j)))
+        used_a.add(i)
+        used_b.add(j)
+    return pairs
+
+
+def agreement(reference, candidate, iou_threshold=0.5):
+    """F1 of candidate per-image detections against reference ones (no labels needed)"""
+    matched = n_ref = n_cand = 0
+    for (ref_boxes, ref_classes, _), (boxes, classes, _) in zip(reference, candidate):
+        matched += len(greedy_match(ref_boxes, ref_classes, boxes, classes, iou_threshold))
+        n_ref += len(ref_boxes)
+        n_cand += len(boxes)
+    recall = matched / n_ref if n_ref else 1.0
+    precision = matched / n_cand if n_cand else 1.0
+    return 2 * recall * precision / (recall + precision) if recall + precision else 0.0
+
+
+# ================= DRAWING =================
+def draw(frame, boxes, classes, scores, names, color=(0, 255, 0)):
+    """Draw xyxy boxes with class labels onto frame in place and return it"""
+    for box, cls, score in zip(boxes.astype(int), classes, scores):
+        x1, y1, x2, y2 = box
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        label = f"{names[int(cls)]} {score:.2f}"
+        cv2.putText(frame, label, (x1, max(y1 - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+    return frame
@@ -0,0 +1,228 @@
+import atexit
+import itertools
+import math
+import multiprocessing as mp
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.shared_memory import SharedMemory
+
+import cv2
+import numpy as np
+
+from detections import DetectionResult, from_result, to_bgr
+
+MAX_BATCH = 8
+MAX_WAIT_MS = 10
+SLOTS = 16
+SLOT_BYTES = 1920 * 1080 * 3
+# Giới hạn chờ slot trống / kết quả, để worker treo hoặc chết không làm treo session
+REQUEST_TIMEOUT = 30
+
+
+# ================= WORKER PROCESS =================
+def _serve(weights_path, engine, shm_name, slot_bytes, requests, responses, max_batch, max_wait, counters):
+    """Worker process: owns the model and answers coalesced batches of requests"""
+    from model_registry import ModelRegistry
+
+    # Worker dùng chung resource_tracker với process cha, process cha sẽ unlink khi close()
+    shm = SharedMemory(name=shm_name)
+
+    model = ModelRegistry(models={"served": weights_path}, max_models=1).get("served", engine)
+    responses.put(("ready", dict(model.names)))
+
+    running = True
+    while running:
+        item = requests.get()
+        if item is None:
+            break
+        batch = [item]
+        deadline = time.monotonic() + max_wait
+        # Gom thêm request từ mọi session cho tới khi đủ batch hoặc hết thời gian chờ
+        while len(batch) < max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                running = False
+                break
+            batch.append(item)
+
+        # Frame được đọc trực tiếp từ shared memory, không qua pickle
+        frames = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+                  for _, slot, shape in batch]
+        try:
+            results = model(frames, verbose=False)
+            for (request_id, _, _), result in zip(batch, results):
+                responses.put((request_id, from_result(result)))
+        except Exception as e:
+            for request_id, _, _ in batch:
+                responses.put((request_id, RuntimeError(f"Inference server lỗi: {e}")))
+        finally:
+            del frames
+            results = None
+
+        with counters.get_lock():
+            counters[0] += 1
+            counters[1] += len(batch)
+
+    shm.close()
+
+
+# ================= CLIENT =================
+class InferenceServer:
+    """Local worker process shared by every Streamlit session and webcam stream.
+
+    Callers copy their frame into a free shared-memory slot and enqueue only
+    (request id, slot, shape); the worker coalesces requests into batches of up
+    to max_batch frames, waiting at most max_wait_ms for a batch to fill, and
+    sends back only the small detection arrays. The object is callable like a
+    YOLO model, so it plugs into the existing image, video and webcam paths.
+
+    If the worker process dies, every pending request fails with RuntimeError
+    and alive turns False; waits for a slot or a result give up after timeout
+    seconds.
+    """
+
+    def __init__(self, weights_path, engine="pytorch", max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS,
+                 slots=SLOTS, slot_bytes=SLOT_BYTES, timeout=REQUEST_TIMEOUT):
+        self.slot_bytes = slot_bytes
+        self.timeout = timeout
+        self._shm = SharedMemory(create=True, size=slots * slot_bytes)
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+        ctx = mp.get_context("spawn")
+        self._requests = ctx.Queue()
+        self._responses = ctx.Queue()
+        self._counters = ctx.Array("q", 2)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._closed = False
+
+        self._process = ctx.Process(
+            target=_serve, daemon=True,
+            args=(weights_path, engine, self._shm.name, slot_bytes, self._requests, self._responses,
+                  max_batch, max_wait_ms / 1000, self._counters))
+        self._process.start()
+
+        while True:
+            try:
+                _, self.names = self._responses.get(timeout=1)
+                break
+            except queue.Empty:
+                if not self._process.is_alive():
+                    self._shm.close()
+                    self._shm.unlink()
+                    raise RuntimeError("Inference server không khởi động được (không tải được model)")
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        atexit.register(self.close)
+
+    @property
+    def alive(self):
+        return not self._closed and self._process.is_alive()
+
+    def _fail_pending(self, error):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+
+    def _dispatch(self):
+        while True:
+            try:
+                message = self._responses.get(timeout=1)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    self._fail_pending(RuntimeError("Inference server đã dừng đột ngột"))
+                    return
+                continue
+            if message is None:
+                return
+            request_id, payload = message
+            with self._pending_lock:
+                future = self._pending.pop(request_id, None)
+            if future is not None:
+                if isinstance(payload, Exception):
+                    future.set_exception(payload)
+                else:
+                    future.set_result(payload)
+
+    def submit(self, frame):
+        """Queue one BGR uint8 frame; returns a Future of (boxes, classes, scores)"""
+        scale = 1.0
+        if frame.nbytes > self.slot_bytes:
+            # Frame lớn hơn slot: thu nhỏ cho vừa rồi phóng box về kích thước gốc
+            scale = math.sqrt(self.slot_bytes / frame.nbytes) * 0.99
+            frame = cv2.resize(frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)))
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+
+        if not self.alive:
+            raise RuntimeError("Inference server không còn chạy")
+        try:
+            slot = self._free.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Không có slot trống sau {self.timeout}s") from None
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf, offset=slot * self.slot_bytes)
+        view[...] = frame
+        del view
+
+        request_id = next(self._ids)
+        inner = Future()
+        with self._pending_lock:
+            self._pending[request_id] = inner
+        self._requests.put((request_id, slot, frame.shape))
+        if not self._process.is_alive():
+            # Worker chết giữa lúc đăng ký: dispatcher có thể đã thoát, tự huỷ các request còn treo
+            self._fail_pending(RuntimeError("Inference server đã dừng đột ngột"))
+
+        outer = Future()
+
+        def done(f):
+            # Trả slot khi worker đã xử lý xong frame
+            self._free.put(slot)
+            if f.exception() is not None:
+                outer.set_exception(f.exception())
+                return
+            boxes, classes, scores = f.result()
+            outer.set_result(((boxes / scale).astype(np.float32), classes, scores))
+
+        inner.add_done_callback(done)
+        return outer
+
+    def __call__(self, source, verbose=False):
+        images = source if isinstance(source, list) else [source]
+        images = [to_bgr(image) for image in images]
+        futures = [self.submit(image) for image in images]
+        return [DetectionResult(image, f.result(timeout=self.timeout), self.names)
+                for image, f in zip(images, futures)]
+
+    def stats(self):
+        with self._counters.get_lock():
+            batches, frames = self._counters[0], self._counters[1]
+        return {
+            "batches": batches,
+            "frames": frames,
+            "avg_batch": frames / batches if batches else 0.0,
+            "in_flight": len(self._pending),
+        }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._requests.put(None)
+        self._process.join(timeout=10)
+        self._responses.put(None)
+        self._dispatcher.join(timeout=1)
+        self._fail_pending(RuntimeError("Inference server đã đóng"))
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,193 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bật bằng YOLO_METRICS=1, METRICS_PORT hoặc checkbox trên trang demo; đã bật thì app không tắt lại
+ENABLED = os.environ.get("YOLO_METRICS", "0") == "1"
+
+# Bucket (giây) của histogram, theo quy ước Prometheus
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+_lock = threading.Lock()
+_histograms = {}
+_gauges = {}
+_skip_ratios = {}
+_collectors = []
+_NOOP = nullcontext()
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+# ================= RECORDING =================
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        # Ước lượng từ bucket: cận trên của bucket chứa quantile q
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+def observe(path, stage, seconds):
+    """Record one duration for stage of path ("image", "video" or "webcam")"""
+    if not ENABLED:
+        return
+    with _lock:
+        hist = _histograms.get((path, stage))
+        if hist is None:
+            hist = _histograms[(path, stage)] = _Histogram()
+        hist.observe(seconds)
+
+
+class _Timer:
+    __slots__ = ("path", "stage", "start")
+
+    def __init__(self, path, stage):
+        self.path = path
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.path, self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def stage(path, name):
+    """``with metrics.stage("video", "plot"): ...``; a shared no-op when disabled"""
+    if not ENABLED:
+        return _NOOP
+    return _Timer(path, name)
+
+
+def observe_result(path, result):
+    """Split model time into preprocess / inference / nms using Results.speed (ms per image)"""
+    if not ENABLED:
+        return
+    speed = getattr(result, "speed", None)
+    if not speed:
+        return
+    for key, name in (("preprocess", "preprocess"), ("inference", "inference"), ("postprocess", "nms")):
+        if speed.get(key) is not None:
+            observe(path, name, speed[key] / 1000)
+
+
+def set_fps(path, value):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[path] = value
+
+
+def set_skip_ratio(path, value):
+    """Share of frames where inference was skipped (webcam motion gate)"""
+    if not ENABLED:
+        return
+    with _lock:
+        _skip_ratios[path] = value
+
+
+def register_collector(fn):
+    """fn() returns extra exposition lines appended to every render_prometheus();
+    lets other modules (auth) publish their gauges without metrics importing them"""
+    _collectors.append(fn)
+
+
+# ================= EXPORT =================
+def snapshot():
+    """Rows for the stats panel on the demo page"""
+    with _lock:
+        rows = [
+            {
+                "path": path,
+                "stage": name,
+                "count": h.count,
+                "mean_ms": round(h.total / h.count * 1000, 2) if h.count else 0.0,
+                "p95_ms (≤)": h.quantile(0.95) * 1000,
+            }
+            for (path, name), h in sorted(_histograms.items())
+        ]
+        fps = dict(_gauges)
+    return rows, fps
+
+
+def render_prometheus():
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = [
+        "# HELP yolo_stage_seconds Duration of each pipeline stage.",
+        "# TYPE yolo_stage_seconds histogram",
+    ]
+    with _lock:
+        for (path, name), h in sorted(_histograms.items()):
+            labels = f'path="{path}",stage="{name}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, h.counts):
+                cumulative += n
+                lines.append(f'yolo_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'yolo_stage_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"yolo_stage_seconds_sum{{{labels}}} {h.total}")
+            lines.append(f"yolo_stage_seconds_count{{{labels}}} {h.count}")
+
+        lines.append("# HELP yolo_fps Frames per second of the last run of each path.")
+        lines.append("# TYPE yolo_fps gauge")
+        for path, value in sorted(_gauges.items()):
+            lines.append(f'yolo_fps{{path="{path}"}} {value}')
+
+        lines.append("# HELP yolo_inference_skip_ratio Share of frames where inference was skipped.")
+        lines.append("# TYPE yolo_inference_skip_ratio gauge")
+        for path, value in sorted(_skip_ratios.items()):
+            lines.append(f'yolo_inference_skip_ratio{{path="{path}"}} {value}')
+    for collect in _collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Write the exposition atomically, e.g. for node_exporter's textfile collector"""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics (any path) on a local port from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,176 @@
+import threading
+
+import db
+
+_migrated = set()
+_lock = threading.Lock()
+
+
+# -----------------------------
+# Migration 1: bảng gốc
+# -----------------------------
+def _initial_schema(conn):
+    # users: hợp nhất schema của app.py và db.py (email UNIQUE, có thể NULL)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        email TEXT UNIQUE,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS uploads (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        file_name TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        file_type TEXT NOT NULL,
+        result_path TEXT,
+        uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS login_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        login_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+        ip_address TEXT,
+        success BOOLEAN NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """)
+
+
+# -----------------------------
+# Migration 2: bỏ NOT NULL của users.email
+# (bảng users cũ do init_database() của app.py tạo)
+# -----------------------------
+def _reconcile_users(conn):
+    columns = {row[1]: row for row in conn.execute("PRAGMA table_info(users)")}
+    if not columns["email"][3]:
+        return
+
+    conn.execute("""
+    CREATE TABLE users_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        email TEXT UNIQUE,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("""INSERT INTO users_new (id, username, password_hash, email, created_at)
+                    SELECT id, username, password_hash, email, created_at FROM users""")
+    conn.execute("DROP TABLE users")
+    conn.execute("ALTER TABLE users_new RENAME TO users")
+
+
+# -----------------------------
+# Migration 3: index cho truy vấn lịch sử
+# -----------------------------
+def _history_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_user_time ON uploads(user_id, uploaded_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_login_logs_user_time ON login_logs(user_id, login_time)")
+
+
+# -----------------------------
+# Migration 4: detection của mỗi upload + bảng rollup cho trang thống kê
+# -----------------------------
+def _detections(conn):
+    # Số detection của upload lưu sẵn để trang lịch sử không phải COUNT(*) bảng detections
+    conn.execute("ALTER TABLE uploads ADD COLUMN detection_count INTEGER NOT NULL DEFAULT 0")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS detections (
+        id INTEGER PRIMARY KEY,
+        upload_id INTEGER NOT NULL,
+        frame INTEGER NOT NULL DEFAULT 0,
+        class_name TEXT NOT NULL,
+        score REAL NOT NULL,
+        x1 REAL NOT NULL,
+        y1 REAL NOT NULL,
+        x2 REAL NOT NULL,
+        y2 REAL NOT NULL,
+        FOREIGN KEY (upload_id) REFERENCES uploads(id)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_upload_frame ON detections(upload_id, frame)")
+
+    # Số detection theo (user, ngày, class), cập nhật trong cùng transaction với detections
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS detection_daily (
+        user_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        class_name TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day, class_name)
+    ) WITHOUT ROWID
+    """)
+    # Covering index cho thống kê toàn hệ thống (không lọc user)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_detection_daily_day ON detection_daily(day, class_name, count)")
+
+
+# -----------------------------
+# Migration 5: phiên đăng nhập "ghi nhớ đăng nhập"
+# -----------------------------
+def _sessions(conn):
+    # Chỉ lưu SHA-256 của token: lộ DB cũng không dùng được token
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sessions (
+        token_hash TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        expires_at INTEGER NOT NULL,
+        revoked INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+
+
+MIGRATIONS = [
+    (1, _initial_schema),
+    (2, _reconcile_users),
+    (3, _history_indexes),
+    (4, _detections),
+    (5, _sessions),
+]
+
+
+def current_version(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)""")
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate():
+    """Bring the database up to the latest schema version; a no-op after the first call per process"""
+    path = db.DB_NAME
+    if path in _migrated:
+        return
+
+    with _lock:
+        if path in _migrated:
+            return
+        with db.connection() as conn:
+            # BEGIN IMMEDIATE: chỉ một process được migrate tại một thời điểm
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = current_version(conn)
+                for target, step in MIGRATIONS:
+                    if target > version:
+                        step(conn)
+                        conn.execute("INSERT INTO schema_version (version) VALUES (?)", (target,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        _migrated.add(path)
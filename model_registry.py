@@ -0,0 +1,154 @@
+import gc
+import glob
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from ultralytics import YOLO
+
+from onnx_engine import OnnxEngine, load_engine
+
+DEFAULT_MODEL = "best"
+MODELS_DIR = "models"
+MAX_MODELS = int(os.environ.get("YOLO_MAX_MODELS", "2"))
+MEMORY_BUDGET_MB = int(os.environ.get("YOLO_MEMORY_BUDGET_MB", "1024"))
+WARMUP_SIZE = 640
+
+
+def discover_models(models_dir=MODELS_DIR):
+    """Map model name -> weights path: best.pt plus every *.pt in models_dir"""
+    found = OrderedDict()
+    if os.path.exists("best.pt"):
+        found[DEFAULT_MODEL] = "best.pt"
+    for path in sorted(glob.glob(os.path.join(models_dir, "*.pt"))):
+        found.setdefault(os.path.splitext(os.path.basename(path))[0], path)
+    if not found:
+        found[DEFAULT_MODEL] = "best.pt"
+    return found
+
+
+def _model_bytes(model):
+    if isinstance(model, OnnxEngine):
+        # ONNX Runtime giữ trọng số trong session: xấp xỉ bằng kích thước file
+        return os.path.getsize(model.onnx_path)
+    # Bộ nhớ thường trú của model = tổng kích thước parameter + buffer
+    net = model.model
+    tensors = list(net.parameters()) + list(net.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+# ================= MODEL REGISTRY =================
+class ModelRegistry:
+    """Loads YOLO weights by name, warms them up and keeps the most recently used ones resident.
+
+    Each (name, engine) pair is a separate entry; engine is one of onnx_engine.ENGINES.
+
+    At most max_models stay loaded and their combined parameter memory is kept
+    under memory_budget_mb; the least recently used model is evicted first
+    (the one just requested is never evicted). Loading happens outside the
+    registry lock, under a per-key lock, so a slow load or ONNX export never
+    blocks requests for models that are already resident.
+    """
+
+    def __init__(self, models=None, max_models=MAX_MODELS, memory_budget_mb=MEMORY_BUDGET_MB):
+        self.models = models if models is not None else discover_models()
+        self.max_models = max(1, max_models)
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def names(self):
+        return list(self.models)
+
+    def path(self, name):
+        return self.models[name]
+
+    def _hit(self, key):
+        entry = self._loaded.get(key)
+        if entry is None:
+            return None
+        self._loaded.move_to_end(key)
+        entry["hits"] += 1
+        return entry["model"]
+
+    def get(self, name, engine="pytorch"):
+        key = (name, engine)
+        with self._lock:
+            model = self._hit(key)
+            if model is not None:
+                return model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Chỉ các yêu cầu cùng (name, engine) chờ nhau; registry lock chỉ giữ khi sửa dict
+        with load_lock:
+            with self._lock:
+                model = self._hit(key)
+                if model is not None:
+                    return model
+            entry = self._load(name, engine)
+            with self._lock:
+                self._loaded[key] = entry
+                self._load_locks.pop(key, None)
+                self._evict()
+            return entry["model"]
+
+    def _load(self, name, engine):
+        start = time.perf_counter()
+        if engine == "pytorch":
+            model = YOLO(self.models[name])
+        else:
+            model = load_engine(self.models[name], engine)
+        load_seconds = time.perf_counter() - start
+
+        # Warm-up: lần inference đầu tiên khởi tạo kernel/bộ nhớ, trả giá ở đây thay vì cho người dùng
+        start = time.perf_counter()
+        model(np.zeros((WARMUP_SIZE, WARMUP_SIZE, 3), dtype=np.uint8), verbose=False)
+        warmup_seconds = time.perf_counter() - start
+
+        return {
+            "model": model,
+            "load_seconds": load_seconds,
+            "warmup_seconds": warmup_seconds,
+            "bytes": _model_bytes(model),
+            "hits": 0,
+        }
+
+    def _evict(self):
+        evicted = False
+        while len(self._loaded) > 1 and (
+                len(self._loaded) > self.max_models
+                or sum(e["bytes"] for e in self._loaded.values()) > self.memory_budget):
+            self._loaded.popitem(last=False)
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "model": name,
+                    "engine": engine,
+                    "load_s": round(e["load_seconds"], 3),
+                    "warmup_s": round(e["warmup_seconds"], 3),
+                    "memory_mb": round(e["bytes"] / 1024 / 1024, 1),
+                    "hits": e["hits"],
+                }
+                for (name, engine), e in self._loaded.items()
+            ]
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_registry():
+    """Process-wide registry, shared by the app and its background pre-warm thread"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ModelRegistry()
+        return _shared
@@ -0,0 +1,157 @@
+import ast
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from detections import DetectionResult, nms, to_bgr
+
+ENGINES = {
+    "pytorch": "PyTorch",
+    "onnx": "ONNX Runtime",
+    "openvino": "ONNX Runtime + OpenVINO",
+    "int8": "ONNX Runtime INT8",
+}
+
+
+# ================= EXPORT =================
+def export_onnx(weights_path, imgsz=640):
+    """Export weights_path to ONNX once and reuse the file next to the weights while it is newer"""
+    onnx_path = os.path.splitext(weights_path)[0] + ".onnx"
+    if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(weights_path):
+        return onnx_path
+
+    from ultralytics import YOLO
+
+    # dynamic=True để chạy được batch nhiều frame của video
+    exported = YOLO(weights_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+
+def int8_paths(weights_path):
+    """(<name>.int8.onnx, <name>.int8.json) written by quantize.py"""
+    base = os.path.splitext(weights_path)[0]
+    return base + ".int8.onnx", base + ".int8.json"
+
+
+def _approved_int8(weights_path):
+    int8_path, report_path = int8_paths(weights_path)
+    if not os.path.exists(int8_path) or not os.path.exists(report_path):
+        raise RuntimeError("Chưa có model INT8, chạy: python quantize.py --calib <thư mục ảnh>")
+    with open(report_path) as f:
+        report = json.load(f)
+    if report.get("weights_mtime") != os.path.getmtime(weights_path):
+        raise RuntimeError("Model INT8 đã cũ so với trọng số hiện tại, hãy chạy lại quantize.py")
+    if not report.get("approved"):
+        raise RuntimeError(f"Model INT8 bị từ chối: độ chính xác giảm {report['drop']:.1%} "
+                           f"(ngưỡng {report['max_drop']:.1%})")
+    return int8_path
+
+
+# ================= PRE / POST PROCESSING =================
+def letterbox(image, size):
+    """Resize keeping aspect ratio and pad to size x size; returns (canvas, ratio, (pad_x, pad_y))"""
+    h, w = image.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(image, (new_w, new_h),
+                                                                   interpolation=cv2.INTER_LINEAR)
+    return canvas, ratio, (pad_x, pad_y)
+
+
+def preprocess(images, size):
+    """Letterbox a list of BGR images into one (N, 3, size, size) float32 RGB tensor"""
+    batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+    meta = []
+    for i, image in enumerate(images):
+        canvas, ratio, pad = letterbox(image, size)
+        # BGR -> RGB, HWC -> CHW, [0, 255] -> [0, 1] trong một lần ghi
+        np.multiply(canvas[..., ::-1].transpose(2, 0, 1), 1 / 255.0, out=batch[i], casting="unsafe")
+        meta.append((ratio, pad, image.shape[:2]))
+    return batch, meta
+
+
+def postprocess(output, meta, conf=0.25, iou=0.45, max_det=300):
+    """Decode a (N, 4 + nc, anchors) YOLOv8 output into per-image (boxes, classes, scores)"""
+    results = []
+    for pred, (ratio, (pad_x, pad_y), (h, w)) in zip(output, meta):
+        pred = pred.T
+        class_scores = pred[:, 4:]
+        classes = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(pred)), classes]
+        keep = scores >= conf
+        pred, classes, scores = pred[keep], classes[keep], scores[keep]
+
+        cx, cy, bw, bh = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+        idx = nms(boxes, scores, classes, iou)[:max_det]
+        boxes, classes, scores = boxes[idx], classes[idx], scores[idx]
+
+        # Bỏ padding và đưa về toạ độ ảnh gốc
+        boxes -= np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)
+        boxes /= ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        results.append((boxes.astype(np.float32), classes.astype(np.int32), scores.astype(np.float32)))
+    return results
+
+
+# ================= ENGINE =================
+class OnnxEngine:
+    """Callable like a YOLO model: engine(image_or_list, verbose=False) -> list of DetectionResult"""
+
+    def __init__(self, onnx_path, use_openvino=False, conf=0.25, iou=0.45):
+        available = ort.get_available_providers()
+        providers = ["CPUExecutionProvider"]
+        if use_openvino and "OpenVINOExecutionProvider" in available:
+            providers.insert(0, "OpenVINOExecutionProvider")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=providers)
+        self.providers = self.session.get_providers()
+        self.input_name = self.session.get_inputs()[0].name
+        self.conf = conf
+        self.iou = iou
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        self.imgsz = int(ast.literal_eval(metadata["imgsz"])[0]) if "imgsz" in metadata else 640
+
+    def __call__(self, source, verbose=False, conf=None):
+        images = source if isinstance(source, list) else [source]
+        images = [to_bgr(image) for image in images]
+        t0 = time.perf_counter()
+        batch, meta = preprocess(images, self.imgsz)
+        t1 = time.perf_counter()
+        output = self.session.run(None, {self.input_name: batch})[0]
+        t2 = time.perf_counter()
+        dets = postprocess(output, meta, self.conf if conf is None else conf, self.iou)
+        t3 = time.perf_counter()
+
+        # Giống Results.speed của ultralytics: ms trung bình mỗi ảnh
+        n = len(images)
+        speed = {"preprocess": (t1 - t0) * 1000 / n, "inference": (t2 - t1) * 1000 / n,
+                 "postprocess": (t3 - t2) * 1000 / n}
+        results = [DetectionResult(image, d, self.names) for image, d in zip(images, dets)]
+        for result in results:
+            result.speed = speed
+        return results
+
+
+def load_engine(weights_path, engine):
+    """Build the ONNX-backed engine for weights_path ("onnx", "openvino" or "int8").
+
+    "int8" only loads if quantize.py approved the quantized model for these weights.
+    """
+    if engine == "int8":
+        return OnnxEngine(_approved_int8(weights_path))
+    return OnnxEngine(export_onnx(weights_path), use_openvino=engine == "openvino")
@@ -0,0 +1,135 @@
+"""INT8 quantization of the exported ONNX model with an accuracy guardrail.
+
+Usage: python quantize.py --weights best.pt --calib samples/ [--mode static|dynamic] [--max-drop 0.03]
+
+The quantized model is written next to the weights as <name>.int8.onnx together
+with <name>.int8.json. The app only serves the INT8 engine when that report says
+approved, i.e. detection agreement with the FP32 model dropped by at most max_drop.
+Agreement is measured on --eval when given; otherwise every HOLDOUT_EVERY-th image
+of --calib is held out of calibration and used for evaluation instead.
+"""
+import argparse
+import glob
+import json
+import os
+
+import cv2
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from detections import agreement, from_result
+from onnx_engine import OnnxEngine, export_onnx, int8_paths, preprocess
+
+MAX_DROP = 0.03
+HOLDOUT_EVERY = 5
+
+
+def _image_paths(folder):
+    paths = sorted(p for p in glob.glob(os.path.join(folder, "*")) if os.path.isfile(p))
+    if not paths:
+        raise ValueError(f"Không tìm thấy ảnh trong {folder}")
+    return paths
+
+
+def _iter_images(paths):
+    """Decode images one at a time, skipping files OpenCV cannot read"""
+    for path in paths:
+        img = cv2.imread(path)
+        if img is not None:
+            yield img
+
+
+def _split_holdout(paths, every=HOLDOUT_EVERY):
+    """(calibration paths, evaluation paths): every n-th image is held out for evaluation"""
+    if len(paths) < 2:
+        raise ValueError("Cần ít nhất 2 ảnh trong --calib để tách tập đánh giá, hoặc truyền --eval")
+    holdout = paths[every - 1::every] or paths[-1:]
+    held = set(holdout)
+    return [p for p in paths if p not in held], holdout
+
+
+class _ImageReader(CalibrationDataReader):
+    """Feeds calibration images through the same letterbox preprocessing as OnnxEngine.
+
+    Images are decoded and preprocessed lazily, one per get_next() call.
+    """
+
+    def __init__(self, paths, input_name, imgsz):
+        self._batches = ({input_name: preprocess([img], imgsz)[0]} for img in _iter_images(paths))
+
+    def get_next(self):
+        return next(self._batches, None)
+
+
+# ================= QUANTIZE =================
+def quantize(weights_path, calib_dir, mode="static", max_drop=MAX_DROP, eval_dir=None):
+    """Produce the INT8 model, measure agreement with FP32 and write the approval report"""
+    fp32_path = export_onnx(weights_path)
+    int8_path, report_path = int8_paths(weights_path)
+    fp32 = OnnxEngine(fp32_path)
+
+    calib_paths = _image_paths(calib_dir)
+    if eval_dir:
+        eval_paths = _image_paths(eval_dir)
+    else:
+        # Đánh giá trên chính tập calibration sẽ lạc quan quá mức: tách riêng một phần ảnh
+        calib_paths, eval_paths = _split_holdout(calib_paths)
+    if mode == "static":
+        prepared = int8_path + ".prep.onnx"
+        quant_pre_process(fp32_path, prepared)
+        quantize_static(
+            prepared, int8_path,
+            _ImageReader(calib_paths, fp32.input_name, fp32.imgsz),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+        os.remove(prepared)
+    else:
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    # Guardrail: so sánh với FP32 trên tập đánh giá, đọc từng ảnh một
+    int8 = OnnxEngine(int8_path)
+    reference, candidate = [], []
+    for img in _iter_images(eval_paths):
+        reference.append(from_result(fp32(img)[0]))
+        candidate.append(from_result(int8(img)[0]))
+    if not reference:
+        raise ValueError("Không đọc được ảnh đánh giá nào")
+    score = agreement(reference, candidate)
+
+    report = {
+        "mode": mode,
+        "images": len(reference),
+        "eval": eval_dir or "holdout",
+        "agreement_f1": round(score, 4),
+        "drop": round(1 - score, 4),
+        "max_drop": max_drop,
+        "approved": 1 - score <= max_drop,
+        "weights_mtime": os.path.getmtime(weights_path),
+    }
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--calib", required=True, help="thư mục ảnh mẫu để calibration")
+    parser.add_argument("--eval", default=None, help=f"thư mục ảnh đánh giá (mặc định: giữ lại 1/{HOLDOUT_EVERY} ảnh của --calib)")
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--max-drop", type=float, default=MAX_DROP)
+    args = parser.parse_args()
+
+    report = quantize(args.weights, args.calib, args.mode, args.max_drop, args.eval)
+    print(json.dumps(report, indent=2))
+    if not report["approved"]:
+        print(f"❌ Độ chính xác giảm {report['drop']:.1%} > {args.max_drop:.1%}: model INT8 sẽ không được kích hoạt")
+        raise SystemExit(1)
+    print("✅ Model INT8 đã được kích hoạt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+from detections import from_result
+
+# Bảng màu 20 class (BGR), lặp lại cho class id lớn hơn
+PALETTE = (
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+    (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0),
+    (168, 153, 44), (255, 194, 0), (147, 69, 52), (255, 115, 100), (236, 24, 0),
+    (255, 56, 132), (133, 0, 82), (255, 56, 203), (200, 149, 255), (199, 55, 255),
+)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class Renderer:
+    """Lean replacement for Results.plot(): draws straight into the given frame.
+
+    Class colours and label sprites (text pre-rendered on its background, keyed
+    by class and score rounded to 2 decimals) are cached, so each box costs one
+    cv2.rectangle plus a slice assignment. labels=False draws boxes only;
+    scale < 1 draws on a downscaled copy instead, for previews.
+    """
+
+    def __init__(self, names, labels=True, scale=1.0, thickness=2, font_scale=0.5):
+        self.names = names
+        self.labels = labels
+        self.scale = scale
+        self.thickness = thickness
+        self.font_scale = font_scale * max(scale, 0.5)
+        self._colors = {}
+        self._sprites = {}
+
+    def color(self, cls):
+        color = self._colors.get(cls)
+        if color is None:
+            color = self._colors[cls] = PALETTE[cls % len(PALETTE)]
+        return color
+
+    def sprite(self, cls, score):
+        key = (cls, round(float(score) * 100))
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            text = f"{self.names.get(cls, cls)} {key[1] / 100:.2f}"
+            (w, h), baseline = cv2.getTextSize(text, FONT, self.font_scale, 1)
+            color = self.color(cls)
+            sprite = np.empty((h + baseline + 4, w + 4, 3), dtype=np.uint8)
+            sprite[:] = color
+            # Chữ trắng hoặc đen tuỳ độ sáng nền
+            text_color = (0, 0, 0) if sum(color) > 450 else (255, 255, 255)
+            cv2.putText(sprite, text, (2, h + 2), FONT, self.font_scale, text_color, 1, cv2.LINE_AA)
+            self._sprites[key] = sprite
+        return sprite
+
+    def render(self, frame, detections):
+        """Draw (boxes, classes, scores) on frame in place (or on a downscaled copy) and return it"""
+        boxes, classes, scores = detections
+        if self.scale != 1.0:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            boxes = boxes * self.scale
+        height, width = frame.shape[:2]
+        for (x1, y1, x2, y2), cls, score in zip(boxes.astype(np.int32).tolist(), classes.tolist(), scores):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), self.color(cls), self.thickness)
+            if not self.labels:
+                continue
+            sprite = self.sprite(cls, score)
+            sh, sw = sprite.shape[:2]
+            # Nhãn đặt phía trên box, hoặc bên trong nếu box sát mép trên
+            top = y1 - sh if y1 - sh >= 0 else max(y1, 0)
+            left = min(max(x1, 0), width - 1)
+            h, w = min(sh, height - top), min(sw, width - left)
+            if h > 0 and w > 0:
+                frame[top:top + h, left:left + w] = sprite[:h, :w]
+        return frame
+
+    def render_result(self, result, detections=None):
+        """Render an ultralytics Results / DetectionResult onto its own orig_img buffer"""
+        if detections is None:
+            detections = from_result(result)
+        return self.render(result.orig_img, detections)
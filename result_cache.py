@@ -0,0 +1,132 @@
+import functools
+import hashlib
+import os
+import shutil
+import threading
+
+import cv2
+import numpy as np
+
+CACHE_DIR = os.path.join("cache", "results")
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+# ================= HASHING =================
+@functools.lru_cache(maxsize=16)
+def _file_sha256(path, mtime):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def weights_hash(path):
+    """SHA-256 of a weights file, recomputed only when its mtime changes"""
+    return _file_sha256(path, os.path.getmtime(path))
+
+
+def cache_key(data, model_hash):
+    h = hashlib.sha256(data)
+    h.update(model_hash.encode())
+    return h.hexdigest()
+
+
+# ================= DISK CACHE =================
+class ResultCache:
+    """Content-addressed on-disk cache of detections + annotated image.
+
+    Each entry is a directory <key>/ holding the source bytes, detections.npz
+    and annotated.jpg. The directory mtime is refreshed on every hit and the
+    least recently used entries are evicted once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """Return (detections, entry_dir) or None"""
+        entry = self._entry(key)
+        annotated = os.path.join(entry, "annotated.jpg")
+        if not os.path.exists(annotated):
+            return None
+        # Entry có thể bị evict() của phiên khác xoá giữa chừng: coi như cache miss
+        try:
+            with np.load(os.path.join(entry, "detections.npz")) as data:
+                dets = (data["boxes"], data["classes"], data["scores"])
+            os.utime(entry)
+        except (OSError, ValueError, KeyError):
+            return None
+        return dets, entry
+
+    def put(self, key, data, dets, annotated_bgr):
+        """Store an entry and evict old ones; returns the entry directory"""
+        entry = self._entry(key)
+        os.makedirs(entry, exist_ok=True)
+        with open(os.path.join(entry, "source"), "wb") as f:
+            f.write(data)
+        boxes, classes, scores = dets
+        np.savez_compressed(os.path.join(entry, "detections.npz"), boxes=boxes, classes=classes, scores=scores)
+        # annotated.jpg ghi sau cùng: get() dùng nó làm dấu hiệu entry hoàn chỉnh
+        cv2.imwrite(os.path.join(entry, "annotated.jpg"), annotated_bgr)
+        self.evict(keep=entry)
+        return entry
+
+    def evict(self, keep=None):
+        with self._lock:
+            evict_lru(self.root, self.max_bytes, keep=keep)
+
+
+def _size(path):
+    try:
+        if os.path.isdir(path):
+            return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def evict_lru(root, max_bytes, keep=None):
+    """Delete the least recently modified files / directories directly under root
+    until their total size is at most max_bytes; the path keep and files still
+    being written (*.part*, *.tmp*) are never deleted.
+    Returns the number of entries removed."""
+    if not os.path.isdir(root):
+        return 0
+    entries = []
+    total = 0
+    for entry in os.scandir(root):
+        if ".part" in entry.name or ".tmp" in entry.name:
+            continue
+        try:
+            mtime = entry.stat().st_mtime
+        except OSError:
+            # Bị tiến trình khác xoá trong lúc quét
+            continue
+        size = _size(entry.path)
+        entries.append((mtime, size, entry.path))
+        total += size
+
+    entries.sort()
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        removed += 1
+    return removed
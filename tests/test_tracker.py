@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker import IoUTracker  # noqa: E402
+
+SPEED = 3.0
+
+
+def box_at(frame):
+    x = 100 + SPEED * frame
+    return np.array([[x, 50, x + 80, 130]], dtype=np.float32)
+
+
+@pytest.mark.parametrize("stride", [2, 3, 4, 5])
+def test_velocity_matches_constant_motion(stride):
+    # Dùng đúng thứ tự gọi như process_video / evaluate_stride: update() ở frame detect, predict() ở frame bỏ qua
+    tracker = IoUTracker()
+    for frame in range(4 * stride + 1):
+        if frame % stride == 0:
+            tracker.update(box_at(frame), np.zeros(1, np.int32), np.ones(1, np.float32))
+        else:
+            tracker.predict()
+    np.testing.assert_allclose(tracker.velocity[0], [SPEED, 0, SPEED, 0], atol=1e-4)
+
+
+@pytest.mark.parametrize("stride", [2, 3, 4, 5])
+def test_skipped_frames_follow_the_box(stride):
+    tracker = IoUTracker()
+    for frame in range(4 * stride):
+        if frame % stride == 0:
+            tracker.update(box_at(frame), np.zeros(1, np.int32), np.ones(1, np.float32))
+        else:
+            tracker.predict()
+            if frame > stride:
+                np.testing.assert_allclose(tracker.current()[0], box_at(frame), atol=1e-3)
@@ -0,0 +1,59 @@
+import numpy as np
+
+from detections import DetectionResult, empty, from_result, nms, to_bgr
+
+TILE_SIZE = 640
+TILE_OVERLAP = 0.2
+
+
+def tile_origins(length, tile, overlap):
+    """Start offsets along one axis; the last tile is aligned to the border"""
+    if length <= tile:
+        return [0]
+    step = max(int(tile * (1 - overlap)), 1)
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def make_tiles(image, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Split image into overlapping tiles; returns (views, (x, y) offsets)"""
+    h, w = image.shape[:2]
+    tiles, offsets = [], []
+    for y in tile_origins(h, tile_size, overlap):
+        for x in tile_origins(w, tile_size, overlap):
+            # View, không copy: model tự letterbox từng tile
+            tiles.append(image[y:y + tile_size, x:x + tile_size])
+            offsets.append((x, y))
+    return tiles, offsets
+
+
+def tiled_predict(model, image, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, iou_threshold=0.45,
+                  include_full=True):
+    """Run model on overlapping tiles in one batch and merge back to full-image coordinates.
+
+    With include_full the downscaled whole image is added to the batch so large
+    objects that span several tiles are still found. Returns a DetectionResult.
+    """
+    image = to_bgr(image)
+    tiles, offsets = make_tiles(image, tile_size, overlap)
+    if include_full and len(tiles) > 1:
+        tiles.append(image)
+        offsets.append((0, 0))
+
+    results = model(tiles, verbose=False)
+
+    parts = []
+    for result, (x, y) in zip(results, offsets):
+        boxes, classes, scores = from_result(result)
+        if len(boxes):
+            parts.append((boxes + np.array([x, y, x, y], dtype=np.float32), classes, scores))
+    if not parts:
+        return DetectionResult(image, empty(), model.names)
+
+    boxes = np.concatenate([p[0] for p in parts])
+    classes = np.concatenate([p[1] for p in parts])
+    scores = np.concatenate([p[2] for p in parts])
+    # Box trùng ở vùng chồng lấn giữa các tile được gộp bằng NMS theo class
+    keep = nms(boxes, scores, classes, iou_threshold)
+    return DetectionResult(image, (boxes[keep], classes[keep], scores[keep]), model.names)
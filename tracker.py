@@ -0,0 +1,115 @@
+import cv2
+import numpy as np
+
+from detections import from_result, greedy_match
+
+
+# ================= IOU TRACKER =================
+class IoUTracker:
+    """Lightweight multi-object tracker: IoU association + constant-velocity motion"""
+
+    def __init__(self, iou_threshold=0.3, max_missed=2):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.classes = np.zeros((0,), dtype=np.int32)
+        self.scores = np.zeros((0,), dtype=np.float32)
+        self.velocity = np.zeros((0, 4), dtype=np.float32)
+        self.anchor = np.zeros((0, 4), dtype=np.float32)  # box tại lần detect gần nhất
+        self.since = np.zeros((0,), dtype=np.int32)       # số frame từ lần detect gần nhất
+        self.missed = np.zeros((0,), dtype=np.int32)
+
+    def predict(self):
+        """Advance every track by one frame (used on frames without detection)"""
+        self.boxes = self.boxes + self.velocity
+        self.since = self.since + 1
+
+    def update(self, boxes, classes, scores):
+        """Associate fresh detections with existing tracks.
+
+        Called instead of predict() on frames where the detector ran: tracks are
+        first advanced to this frame, so association uses their predicted boxes
+        and the velocity is the displacement over the real frame gap.
+        """
+        self.predict()
+        pairs = greedy_match(self.boxes, self.classes, boxes, classes, self.iou_threshold)
+        matched_tracks = np.array([i for i, _ in pairs], dtype=np.int64)
+        matched_dets = np.array([j for _, j in pairs], dtype=np.int64)
+
+        velocity = self.velocity.copy()
+        if len(pairs):
+            steps = np.maximum(self.since[matched_tracks], 1)[:, None]
+            velocity[matched_tracks] = (boxes[matched_dets] - self.anchor[matched_tracks]) / steps
+
+        missed = self.missed + 1
+        missed[matched_tracks] = 0
+        keep = missed <= self.max_missed
+
+        new_dets = np.setdiff1d(np.arange(len(boxes)), matched_dets)
+        track_boxes = self.boxes.copy()
+        track_boxes[matched_tracks] = boxes[matched_dets]
+        track_scores = self.scores.copy()
+        track_scores[matched_tracks] = scores[matched_dets]
+
+        self.boxes = np.concatenate([track_boxes[keep], boxes[new_dets]]).astype(np.float32)
+        self.classes = np.concatenate([self.classes[keep], classes[new_dets]]).astype(np.int32)
+        self.scores = np.concatenate([track_scores[keep], scores[new_dets]]).astype(np.float32)
+        self.velocity = np.concatenate([velocity[keep], np.zeros((len(new_dets), 4))]).astype(np.float32)
+        self.anchor = self.boxes.copy()
+        self.since = np.zeros(len(self.boxes), dtype=np.int32)
+        self.missed = np.concatenate([missed[keep], np.zeros(len(new_dets))]).astype(np.int32)
+
+    def current(self):
+        """Boxes to display: tracks that were matched at the last detection"""
+        visible = self.missed == 0
+        return self.boxes[visible], self.classes[visible], self.scores[visible]
+
+
+# ================= ACCURACY VS BASELINE =================
+def evaluate_stride(model, video_path, stride, iou_threshold=0.5, max_frames=None):
+    """Compare stride-K tracking against running the detector on every frame.
+
+    The every-frame detections are used as ground truth; returns recall,
+    precision and F1 of the tracked boxes plus the detector call savings.
+    """
+    stride = max(1, int(stride))
+    tracker = IoUTracker()
+    cap = cv2.VideoCapture(video_path)
+    frames = 0
+    true_pos = 0
+    n_baseline = 0
+    n_tracked = 0
+    try:
+        while max_frames is None or frames < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            base_boxes, base_classes, base_scores = from_result(model(frame, verbose=False)[0])
+
+            # Frame detect dùng lại kết quả baseline (cùng model, cùng frame)
+            if frames % stride == 0:
+                tracker.update(base_boxes, base_classes, base_scores)
+            else:
+                tracker.predict()
+            boxes, classes, _ = tracker.current()
+
+            true_pos += len(greedy_match(base_boxes, base_classes, boxes, classes, iou_threshold))
+            n_baseline += len(base_boxes)
+            n_tracked += len(boxes)
+            frames += 1
+    finally:
+        cap.release()
+
+    recall = true_pos / n_baseline if n_baseline else 1.0
+    precision = true_pos / n_tracked if n_tracked else 1.0
+    f1 = 2 * recall * precision / (recall + precision) if recall + precision else 0.0
+    detector_calls = (frames + stride - 1) // stride
+    return {
+        "frames": frames,
+        "stride": stride,
+        "recall": recall,
+        "precision": precision,
+        "f1": f1,
+        "detector_calls": detector_calls,
+        "saved_calls": 1 - detector_calls / frames if frames else 0.0,
+    }
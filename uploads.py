@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import time
+import weakref
+
+import cv2
+import numpy as np
+
+from result_cache import cache_key
+
+UPLOAD_DIR = os.path.join("cache", "uploads")
+CHUNK_SIZE = 1024 * 1024
+# Thư mục phiên bị bỏ lại (process chết, không kịp dọn) sẽ bị xoá sau chừng này giây
+STALE_AFTER = 6 * 3600
+
+
+# ================= DECODING =================
+def decode_image(uploaded_file):
+    """Decode an uploaded image to BGR straight from the upload buffer, without copying the bytes"""
+    with uploaded_file.getbuffer() as buf:
+        return cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def upload_key(uploaded_file, model_hash, memo=None):
+    """cache_key of the upload bytes and model_hash.
+
+    memo (a dict kept in session_state) remembers the key per upload file_id,
+    so fragment reruns do not hash the whole upload again; only the keys of
+    the current upload are kept.
+    """
+    file_id = getattr(uploaded_file, "file_id", None)
+    if memo is None or file_id is None:
+        with uploaded_file.getbuffer() as buf:
+            return cache_key(buf, model_hash)
+
+    key = memo.get((file_id, model_hash))
+    if key is None:
+        with uploaded_file.getbuffer() as buf:
+            key = cache_key(buf, model_hash)
+        for stale in [k for k in memo if k[0] != file_id]:
+            del memo[stale]
+        memo[(file_id, model_hash)] = key
+    return key
+
+
+# ================= SESSION TEMP FILES =================
+class SessionFiles:
+    """Per-session spool directory for uploads that need a path on disk (videos).
+
+    Files are written in CHUNK_SIZE slices of the upload buffer, so no second
+    in-memory copy of the upload is made. Only the current upload is kept; the
+    directory is removed by cleanup(), when the object is garbage collected with
+    its session state, or at interpreter exit.
+    """
+
+    def __init__(self, root=UPLOAD_DIR):
+        os.makedirs(root, exist_ok=True)
+        self.dir = tempfile.mkdtemp(prefix="session-", dir=root)
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.dir, True)
+
+    def spool(self, uploaded_file, key):
+        """Write the upload to <dir>/<key><ext> once and return the path"""
+        path = os.path.join(self.dir, key + os.path.splitext(uploaded_file.name)[1].lower())
+        if os.path.exists(path):
+            return path
+
+        # Upload mới thay thế upload cũ của phiên
+        for entry in os.scandir(self.dir):
+            if entry.is_file():
+                os.remove(entry.path)
+
+        tmp = path + ".part"
+        with uploaded_file.getbuffer() as buf, open(tmp, "wb") as f:
+            for offset in range(0, len(buf), CHUNK_SIZE):
+                f.write(buf[offset:offset + CHUNK_SIZE])
+        os.replace(tmp, path)
+        return path
+
+    def cleanup(self):
+        self._finalizer()
+
+
+def sweep_stale(root=UPLOAD_DIR, max_age=STALE_AFTER):
+    """Remove session directories left behind by sessions that never cleaned up"""
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
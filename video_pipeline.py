@@ -0,0 +1,239 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+import metrics
+from detections import from_result
+from renderer import Renderer
+from result_cache import evict_lru
+from tracker import IoUTracker
+
+
+# ================= DECODE THREAD =================
+def _decode_frames(cap, frame_queue, stop_event):
+    """Read frames from cap into frame_queue until EOF or stop_event is set"""
+    try:
+        while not stop_event.is_set():
+            with metrics.stage("video", "decode"):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            # Queue có giới hạn: chờ chỗ trống nhưng vẫn kiểm tra stop_event
+            while not stop_event.is_set():
+                try:
+                    frame_queue.put(frame, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+    finally:
+        # None báo hiệu hết video cho luồng xử lý
+        while True:
+            try:
+                frame_queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                if stop_event.is_set():
+                    break
+
+
+def _next_batch(frame_queue, batch_size):
+    """Collect up to batch_size frames; returns (frames, finished)"""
+    frames = []
+    while len(frames) < batch_size:
+        frame = frame_queue.get()
+        if frame is None:
+            return frames, True
+        frames.append(frame)
+    return frames, False
+
+
+# ================= OUTPUT FILE =================
+OUTPUT_DIR = os.path.join("cache", "videos")
+OUTPUT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Trong lúc ghi file, UI chỉ nhận một ảnh preview nhỏ mỗi PREVIEW_EVERY frame
+PREVIEW_EVERY = 30
+PREVIEW_WIDTH = 320
+
+
+def output_path(key, root=OUTPUT_DIR):
+    return os.path.join(root, f"{key}.mp4")
+
+
+def cached_output(key, root=OUTPUT_DIR):
+    """Path of the finished MP4 for key, or None; refreshes its mtime for LRU eviction"""
+    path = output_path(key, root)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def video_info(path):
+    """(fps, frame_count, width, height) of a video file"""
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = fps if fps > 0 else 30.0
+        return (fps, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    finally:
+        cap.release()
+
+
+class VideoWriterThread:
+    """Encodes annotated frames to an MP4 with cv2.VideoWriter on a background thread.
+
+    Raises ValueError when the writer cannot be opened (e.g. the input video
+    could not be decoded, so its size is 0x0). close() moves the finished file
+    into place and evicts the oldest outputs beyond max_bytes; abort() stops
+    the thread and deletes the partial file, and is a no-op after close().
+    """
+
+    def __init__(self, path, fps, size, queue_size=64, max_bytes=OUTPUT_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._tmp = path + ".part.mp4"
+        self._writer = None
+        if size[0] > 0 and size[1] > 0:
+            self._writer = cv2.VideoWriter(self._tmp, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+        if self._writer is None or not self._writer.isOpened():
+            self._discard()
+            raise ValueError("Không đọc được video hoặc không tạo được file MP4 kết quả")
+        self._closed = False
+        self._size = size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.frames = 0
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            if (frame.shape[1], frame.shape[0]) != self._size:
+                frame = cv2.resize(frame, self._size)
+            with metrics.stage("video", "encode"):
+                self._writer.write(frame)
+            self.frames += 1
+
+    def write(self, frame):
+        self._queue.put(frame)
+
+    def _stop(self):
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._writer.release()
+
+    def _discard(self):
+        if self._writer is not None:
+            self._writer.release()
+        try:
+            os.remove(self._tmp)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Flush pending frames and move the finished file into place; returns its path"""
+        self._stop()
+        os.replace(self._tmp, self.path)
+        evict_lru(os.path.dirname(self.path) or ".", self.max_bytes, keep=self.path)
+        return self.path
+
+    def abort(self):
+        if self._closed:
+            return
+        self._stop()
+        self._discard()
+
+
+# ================= BATCHED INFERENCE =================
+def process_video(model, video_path, batch_size=8, queue_size=32, on_frame=None, stride=1, recorder=None,
+                  renderer=None):
+    """Decode video_path on a background thread and run model on batches of frames.
+
+    With stride > 1 the detector only runs on every stride-th frame and an
+    IoUTracker carries the boxes across the skipped frames.
+    on_frame(annotated, index) is called on the caller's thread for every frame.
+    recorder (a DetectionRecorder) receives the raw detections of every frame
+    the detector ran on, i.e. every frame when stride == 1. renderer (a Renderer) draws the boxes
+    into the decoded frames; defaults to one with labels at full size.
+    Returns a dict with the number of frames, elapsed seconds and fps.
+    """
+    batch_size = max(1, int(batch_size))
+    stride = max(1, int(stride))
+    tracker = IoUTracker() if stride > 1 else None
+    renderer = renderer or Renderer(model.names)
+    cap = cv2.VideoCapture(video_path)
+    frame_queue = queue.Queue(maxsize=max(queue_size, batch_size))
+    stop_event = threading.Event()
+    reader = threading.Thread(target=_decode_frames, args=(cap, frame_queue, stop_event), daemon=True)
+
+    processed = 0
+    start = time.perf_counter()
+    reader.start()
+    try:
+        finished = False
+        while not finished:
+            frames, finished = _next_batch(frame_queue, batch_size)
+            if not frames:
+                break
+
+            if tracker is None:
+                # Chạy YOLO một lần cho cả batch
+                with metrics.stage("video", "model"):
+                    results = model(frames, verbose=False)
+                for frame, result in zip(frames, results):
+                    metrics.observe_result("video", result)
+                    dets = from_result(result)
+                    if recorder is not None:
+                        recorder.add(processed, dets)
+                    with metrics.stage("video", "plot"):
+                        annotated = renderer.render(frame, dets)
+                    if on_frame is not None:
+                        with metrics.stage("video", "display"):
+                            on_frame(annotated, processed)
+                    processed += 1
+                continue
+
+            # Chỉ detect các frame rơi vào bước stride, các frame còn lại dùng tracker
+            detect_idx = [i for i in range(len(frames)) if (processed + i) % stride == 0]
+            with metrics.stage("video", "model"):
+                results = model([frames[i] for i in detect_idx], verbose=False) if detect_idx else []
+            detected = dict(zip(detect_idx, results))
+            for i, frame in enumerate(frames):
+                with metrics.stage("video", "track"):
+                    if i in detected:
+                        metrics.observe_result("video", detected[i])
+                        dets = from_result(detected[i])
+                        tracker.update(*dets)
+                        if recorder is not None:
+                            recorder.add(processed, dets)
+                    else:
+                        tracker.predict()
+                with metrics.stage("video", "plot"):
+                    annotated = renderer.render(frame, tracker.current())
+                if on_frame is not None:
+                    with metrics.stage("video", "display"):
+                        on_frame(annotated, processed)
+                processed += 1
+    finally:
+        stop_event.set()
+        reader.join()
+        cap.release()
+
+    elapsed = time.perf_counter() - start
+    fps = processed / elapsed if elapsed > 0 else 0.0
+    metrics.set_fps("video", fps)
+    return {
+        "frames": processed,
+        "seconds": elapsed,
+        "fps": fps,
+        "detector_calls": (processed + stride - 1) // stride,
+    }
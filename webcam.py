@@ -0,0 +1,176 @@
+import threading
+import time
+
+import av
+import cv2
+import numpy as np
+from streamlit_webrtc import VideoProcessorBase
+
+import metrics
+from detections import empty, from_result
+from renderer import Renderer
+
+# Model lỗi liên tục (vd. inference server đã chết): nghỉ một chút trước frame tiếp theo
+ERROR_BACKOFF = 0.5
+
+
+# ================= MOTION GATE =================
+class MotionGate:
+    """Cheap scene-change test run before each inference.
+
+    The frame is shrunk to size (INTER_AREA also averages out sensor noise),
+    converted to gray and compared with the last frame YOLO actually ran on.
+    The scene counts as changed when more than min_changed of the pixels
+    differ by more than pixel_delta; after max_skip skipped frames inference
+    runs anyway, so slow changes are never missed for long.
+    """
+
+    def __init__(self, min_changed=0.005, pixel_delta=25, max_skip=30, size=(64, 36)):
+        self.min_changed = min_changed
+        self.pixel_delta = pixel_delta
+        self.max_skip = max_skip
+        self.size = size
+        self._reference = None
+        self._skipped = 0
+
+    def should_run(self, img):
+        small = cv2.cvtColor(cv2.resize(img, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        if self._reference is not None and self._skipped < self.max_skip:
+            changed = np.count_nonzero(cv2.absdiff(small, self._reference) > self.pixel_delta)
+            if changed <= self.min_changed * small.size:
+                self._skipped += 1
+                return False
+        self._reference = small
+        self._skipped = 0
+        return True
+
+
+# ================= ASYNC WEBCAM PROCESSOR =================
+class YOLOProcessor(VideoProcessorBase):
+    """Latest-frame-wins webcam processor.
+
+    recv() never runs the model: it hands the newest frame to a worker thread
+    (dropping any frame the worker has not picked up yet) and returns at once,
+    either with the last annotated result or with the raw frame overlaid with
+    the last known boxes. With a motion_gate (a MotionGate) the worker skips
+    inference on frames where the scene has not changed and keeps the previous
+    detections. A failing model call is counted in stats() and clears the
+    last detections instead of killing the worker.
+    """
+
+    def __init__(self, model, overlay=True, renderer=None, motion_gate=None):
+        self.model = model
+        self.overlay = overlay
+        self.renderer = renderer or Renderer(model.names)
+        self.motion_gate = motion_gate
+
+        self._cond = threading.Condition()
+        self._pending = None
+        self._running = True
+        self._last_dets = empty()
+        self._last_annotated = None
+
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.frames_skipped = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_infer_ms = 0.0
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                img, self._pending = self._pending, None
+
+            if self.motion_gate is not None:
+                with metrics.stage("webcam", "motion_gate"):
+                    run = self.motion_gate.should_run(img)
+                if not run:
+                    # Cảnh không đổi: giữ detection cũ, không chạy YOLO
+                    with self._cond:
+                        self.frames_skipped += 1
+                        skipped, total = self.frames_skipped, self.frames_skipped + self.frames_processed
+                    metrics.set_skip_ratio("webcam", skipped / total)
+                    continue
+
+            # Chạy YOLO ngoài lock để recv không bị chặn
+            start = time.perf_counter()
+            try:
+                with metrics.stage("webcam", "model"):
+                    result = self.model(img, verbose=False)[0]
+            except Exception as e:
+                # Không để lỗi model (RuntimeError/TimeoutError của inference server...) giết luồng worker;
+                # bỏ box cũ để recv() không vẽ mãi kết quả đã lỗi thời
+                with self._cond:
+                    self.errors += 1
+                    self.last_error = str(e)
+                    self._last_dets = empty()
+                    self._last_annotated = None
+                time.sleep(ERROR_BACKOFF)
+                continue
+            metrics.observe_result("webcam", result)
+            dets = from_result(result)
+            if self.overlay:
+                annotated = None
+            else:
+                with metrics.stage("webcam", "plot"):
+                    annotated = self.renderer.render_result(result, dets)
+            infer_ms = (time.perf_counter() - start) * 1000
+            metrics.set_fps("webcam", 1000 / infer_ms if infer_ms > 0 else 0.0)
+
+            with self._cond:
+                self._last_dets = dets
+                self._last_annotated = annotated
+                self.frames_processed += 1
+                self.last_infer_ms = infer_ms
+                skipped, total = self.frames_skipped, self.frames_skipped + self.frames_processed
+            if self.motion_gate is not None:
+                metrics.set_skip_ratio("webcam", skipped / total)
+
+    def recv(self, frame):
+        # to_ndarray đổi YUV -> BGR: đây là bước chuyển màu của đường webcam
+        with metrics.stage("webcam", "to_ndarray"):
+            img = frame.to_ndarray(format="bgr24")
+
+        with self._cond:
+            self.frames_received += 1
+            if self._pending is not None:
+                self.frames_dropped += 1
+            self._pending = img
+            self._cond.notify()
+            dets = self._last_dets
+            annotated = self._last_annotated
+
+        if self.overlay or annotated is None:
+            # Vẽ box gần nhất lên frame mới (bản sao, vì img đang chờ worker xử lý)
+            with metrics.stage("webcam", "draw"):
+                annotated = self.renderer.render(img.copy(), dets)
+
+        with metrics.stage("webcam", "from_ndarray"):
+            return av.VideoFrame.from_ndarray(annotated, format="bgr24")
+
+    def stats(self):
+        with self._cond:
+            return {
+                "received": self.frames_received,
+                "processed": self.frames_processed,
+                "dropped": self.frames_dropped,
+                "skipped": self.frames_skipped,
+                "skip_ratio": round(self.frames_skipped / max(self.frames_skipped + self.frames_processed, 1), 3),
+                "infer_ms": round(self.last_infer_ms, 1),
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+
+    def on_ended(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()